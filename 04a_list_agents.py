@@ -11,12 +11,9 @@ AGENTSPACE_APP_ID = "apagar_1751381593128"
 
 client = AgentspaceManager(project_id=PROJECT_ID,app_id=AGENTSPACE_APP_ID, location="global")
 
-resp = client.list_agents()
-
 print(AGENTSPACE_APP_ID)
 
-agents = resp["agents"]
-for agent in agents:
+for agent in client.iter_agents():
         print(agent)
         print(agent["name"])
         print(agent["displayName"])
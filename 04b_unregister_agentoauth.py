@@ -17,15 +17,9 @@ AGENTSPACE_APP_NAME = os.getenv('AGENTSPACE_ADK_APP_NAME')
 client = AgentspaceManager(project_id=PROJECT_ID,app_id=AGENTSPACE_APP_ID, location="global")
 
 
-resp = client.list_agents()
-
 print(AGENTSPACE_APP_ID)
 
-agents = resp["agents"]
-agents_to_be_removed = []
-for agent in agents:
-        agent["displayName"] == AGENTSPACE_APP_NAME
-        agents_to_be_removed.append(agent["name"])
+agents_to_be_removed = [agent["name"] for agent in client.find_agents(display_name=AGENTSPACE_APP_NAME)]
 
 for agent in agents_to_be_removed:
         resp = client.delete_agent(
@@ -1,119 +1,38 @@
 import os
-from dotenv import load_dotenv
-from google.adk.agents import Agent
-from google.genai import types
-from google.auth import default
-from google.auth import transport
-import requests
-from google.adk.tools import ToolContext, FunctionTool
+import threading
+import typing
 import logging
 
-load_dotenv()
-
-# Configura o logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# The Discovery Engine service, its configuration and caches are shared with no_llm;
+# deploy_agent_ae.py runs the warm_up found in this module
+from datastore_service import (
+    AGENTSPACE_APP_ID, AUTH_NAME, DATA_STORE_ID, DISCOVERY_SESSION_AFFINITY, DISCOVERY_SESSIONS, LOCATION, PROJECT_ID,
+    RETRIEVAL_STRATEGY, TELEMETRY, DatastoreUnavailableError, get_datastore_service, warm_up,
 )
+from discovery_common import DISCOVERY_SESSION_STATE_KEY
+
+# google.adk, google.genai, google.auth and requests are imported on first use, so importing
+# this module stays cheap for Agent Engine cold starts and for deploy_agent_ae packaging.
+if typing.TYPE_CHECKING:
+    from google.adk.tools import ToolContext
+
+# Logging is configured by the host (Agent Engine, adk web, the deploy script)
 logger = logging.getLogger(__name__)
 
+# Read after datastore_service loaded a local .env
 MODEL = os.getenv("MODEL")
 AGENT_APP_NAME = os.getenv("AGENT_DISPLAY_NAME")
-PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
-LOCATION = os.getenv("DATASTORE_LOCATION")
-DATA_STORE_ID = os.getenv("DATASTORE_ID")
-AUTH_NAME = os.getenv("AGENT_AUTH_OBJECT_ID")
-AGENTSPACE_APP_ID = os.getenv("AGENTSPACE_APP_ID_SEARCH")
-
-class DatastoreService:
-    def __init__(self, access_token: str):
-        self.access_token = None
-        if access_token: 
-            self.access_token = access_token
-        else: 
-            creds, project_id = default()
-            auth_req = transport.requests.Request()  # Use google.auth here
-            creds.refresh(auth_req)
-            access_token = creds.token
-            self.access_token = access_token
-
-
-    def search_datastore(self, project_id, location, datastore_id, query):
-        # Define API endpoint and headers
-        url = f"https://{location}-discoveryengine.googleapis.com/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{DATA_STORE_ID}/servingConfigs/default_search:answer"
-
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
-
-        # Define request data with placeholders for query
-        data = {
-            "query": {"text":f"{query}"},
-            "searchSpec": {
-                "searchParams": {
-                    "maxReturnResults": 5
-                }
-                }
-            }
-
-        # Make POST request
-        response = requests.post(url, headers=headers, json=data)
-        
-        logger.info(response.text)
-        
-        try:            
-            return response.json()['answer']['answerText']
-        except Exception as e:
-            logger.error(e)
-            return print(f"An unexpected error occurred in the Agent: {e}")
-        
-
-    def search_streamAssist(self, project_id, location, datastore_id, query):
-        # Define API endpoint and headers
-        url = f"https://{location}-discoveryengine.googleapis.com/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/engines/{AGENTSPACE_APP_ID}/assistants/default_assistant:streamAssist"
-
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
-
-        # Define request data with placeholders for query
-        data = {
-            "query": {"text":f"{query}"},
-        #    "toolsSpec": {
-        #        "vertexAiSearchSpec": {
-        #            "dataStoreSpecs": [ { "dataStore": f"projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{datastore_id}" }]
-        #        }
-        #        }
-            }
-
-        # Make POST request
-        response = requests.post(url, headers=headers, json=data)
-        
-#        try:
-
-        agentspace_answer = ""
 
-        for r in response.json():
-            if "answer" in r:
-                if "replies" in r["answer"]:
-                    for rep in r["answer"]["replies"]:
-                        if "groundedContent" in rep:
-                            if "content" in rep["groundedContent"]:
-                                if "thought" not in rep['groundedContent']['content']:
-                                    agentspace_answer = f"{agentspace_answer} {r['answer']['replies'][0]['groundedContent']['content']['text']}"
 
-        logger.info(f'"Answer": {agentspace_answer}, "url":{url}')
-                                    
-        return f'"Answer": {agentspace_answer}, "url":{url}'
-        #return agentspace_answer
- #       except Exception as e:
- #           logger.error(e)
- #           return print(f"An unexpected error occurred in the Agent: {e}")
+def _adk_session_id(tool_context: "ToolContext") -> str:
+    # Older ADK releases only expose the session through the invocation context
+    session = getattr(tool_context, "session", None)
+    if session is None:
+        session = getattr(getattr(tool_context, "_invocation_context", None), "session", None)
+    return getattr(session, "id", None)
 
 
-
-def search_tasks(query: str, tool_context: ToolContext):
+def search_tasks(query: str, tool_context: "ToolContext"):
         """
         Searches the task registry using the DatastoreService.
         
@@ -123,40 +42,69 @@ def search_tasks(query: str, tool_context: ToolContext):
         Returns:
             dict: The search results from the DatastoreService in JSON format.
         """
-        datastore_service = None
+        import requests
+        datastore_service = get_datastore_service()
         auth_name= f"temp:{AUTH_NAME}"
-        access_token = tool_context.state.get(auth_name)
-        if access_token: 
-            datastore_service = DatastoreService(access_token)
-        else:
-           access_token = ""
-           datastore_service = DatastoreService(access_token)
-        # Call the search method of the DatastoreService with the project ID, App Engine ID, and query
-        results = datastore_service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, query) 
-        # Return the search results
-        return results
-
+        with TELEMETRY.span("search_tasks", strategy=RETRIEVAL_STRATEGY) as span:
+            access_token = datastore_service.resolve_access_token(tool_context.state.get(auth_name), tool_context.user_id)
+            adk_session_id = _adk_session_id(tool_context)
+            session = None
+            if DISCOVERY_SESSION_AFFINITY and adk_session_id:
+                session = DISCOVERY_SESSIONS.get(adk_session_id, tool_context.state.get(DISCOVERY_SESSION_STATE_KEY))
+            # Call the search method of the DatastoreService with the project ID, App Engine ID, and query
+            try:
+                result = datastore_service.retrieve(PROJECT_ID, LOCATION, DATA_STORE_ID, query, access_token, session=session)
+            except (DatastoreUnavailableError, requests.exceptions.RequestException) as e:
+                # Fail fast with an explicit error the model can relay, instead of holding the worker
+                logger.error(f"Datastore search failed: {e}")
+                return {"error": f"The document search is temporarily unavailable: {e}"}
+            if result.session and adk_session_id:
+                # Persisted with the tool's state delta, so the next turn continues this conversation
+                tool_context.state[DISCOVERY_SESSION_STATE_KEY] = DISCOVERY_SESSIONS.put(adk_session_id, result.session)
+            if span is not None:
+                span.set_attribute("backend", result.backend)
+                span.set_attribute("references", len(result.references))
+                span.set_attribute("session_reused", bool(session))
+        # Return the answer, its references and the URL that was queried
+        return dict(result.to_dict(), url=datastore_service.backend_url(result.backend, PROJECT_ID, LOCATION))
 
-task_search_tool = FunctionTool(func=search_tasks)
 
 instruction_prompt = """
 Use as tools disponíveis para responder a pergunta do usuário. 
 Garanta que a resposta final seja um Markdown válido.
 """
 
-logger.info(f"MODEL: `{MODEL}`")
-logger.info(f"AGENT_APP_NAME: `{AGENT_APP_NAME}`")
-logger.info(f"PROJECT_ID: `{PROJECT_ID}`")
-logger.info(f"LOCATION: `{LOCATION}`")
-logger.info(f"DATA_STORE_ID: `{DATA_STORE_ID}`")
-logger.info(f"AUTH_NAME: `{AUTH_NAME}`")
-logger.info(f"AGENTSPACE_APP_ID: `{AGENTSPACE_APP_ID}`")
 
-root_agent = Agent(
+def _build_root_agent():
+    from google.adk.agents import Agent
+    from google.adk.tools import FunctionTool
+    from google.genai import types
+
+    logger.debug(
+        f"MODEL: `{MODEL}`, AGENT_APP_NAME: `{AGENT_APP_NAME}`, PROJECT_ID: `{PROJECT_ID}`, LOCATION: `{LOCATION}`, "
+        f"DATA_STORE_ID: `{DATA_STORE_ID}`, AUTH_NAME: `{AUTH_NAME}`, AGENTSPACE_APP_ID: `{AGENTSPACE_APP_ID}`"
+    )
+
+    task_search_tool = FunctionTool(func=search_tasks)
+
+    return Agent(
         model=MODEL,
         name="root_agent",
         description="Você é um assistente prestativo que responde as perguntas do usuários usando as ferramentas disponíveis.",
         instruction=instruction_prompt,
         generate_content_config=types.GenerateContentConfig(temperature=1),
         tools = [task_search_tool]
-)
\ No newline at end of file
+    )
+
+
+_root_agent_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # root_agent is built on first access (PEP 562), which is what pulls in google.adk and google.genai
+    if name == "root_agent":
+        with _root_agent_lock:
+            if "root_agent" not in globals():
+                globals()["root_agent"] = _build_root_agent()
+        return globals()["root_agent"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
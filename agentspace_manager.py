@@ -1,9 +1,354 @@
-import json
+import copy
+import math
+import time
+import asyncio
+import random
+import threading
+import datetime
+import email.utils
 import requests
+from requests.adapters import HTTPAdapter
 from google import auth as google_auth
 from google.auth.transport import requests as google_requests
 from urllib.parse import urlencode
 from urllib.parse import quote_plus # Or just 'quote' if you don't need to encode spaces as '+'
+from discovery_common import JSON_CODEC, JsonArrayParser, JsonCodec, transport_headers
+
+class CredentialProvider:
+    """
+    Loads Google Application Default Credentials once and hands out cached access tokens.
+
+    The token is reused until it is within `refresh_margin` seconds of its expiry. When
+    `background_refresh` is enabled a daemon timer refreshes a copy of the credentials
+    ahead of time, outside the lock, so callers normally never block on a token round-trip.
+    A single provider is thread-safe and can be shared by several AgentspaceManager instances.
+    """
+
+    def __init__(self, refresh_margin: float = 300.0, background_refresh: bool = True, scopes: list[str] = None):
+        """
+        Initializes the CredentialProvider.
+
+        Args:
+            refresh_margin: Seconds before expiry at which the cached token is considered stale.
+            background_refresh: Whether to refresh the token proactively on a background timer.
+            scopes: Optional OAuth scopes to request for the default credentials.
+        """
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self.scopes = scopes
+        self._credentials = None
+        self._auth_request = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def get_token(self) -> str:
+        """
+        Returns a valid access token, loading or refreshing the credentials only when needed.
+
+        Returns:
+            The OAuth 2.0 access token.
+        """
+        with self._lock:
+            if self._is_stale():
+                self._refresh()
+            return self._credentials.token
+
+    def close(self):
+        """
+        Cancels the pending background refresh, if any.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _seconds_to_expiry(self):
+        expiry = self._credentials.expiry
+        if expiry is None:
+            return None
+        # google-auth keeps expiry as a naive UTC datetime.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds()
+
+    def _is_stale(self) -> bool:
+        if self._credentials is None or not self._credentials.token:
+            return True
+        remaining = self._seconds_to_expiry()
+        return remaining is not None and remaining <= self.refresh_margin
+
+    def _refresh(self):
+        # Must be called with self._lock held.
+        if self._credentials is None:
+            self._credentials, _ = google_auth.default(scopes=self.scopes)
+            self._auth_request = google_requests.Request()
+        self._credentials.refresh(self._auth_request)
+        print("Successfully refreshed access token.")
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if not self.background_refresh:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        remaining = self._seconds_to_expiry()
+        if remaining is None:
+            return
+        # A full margin before the token turns stale, so get_token() is not left waiting
+        # for this refresh while it runs.
+        delay = max(remaining - 2 * self.refresh_margin, 1.0)
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self):
+        # Refreshes a copy outside the lock, so get_token() keeps serving the current token
+        # during the round-trip, then swaps the copy in unless a foreground refresh got newer.
+        with self._lock:
+            self._timer = None
+            credentials, auth_request = self._credentials, self._auth_request
+        try:
+            fresh = copy.copy(credentials)
+            fresh.refresh(auth_request)
+        except Exception as e:
+            # The next get_token() call retries in the foreground.
+            print(f"Background token refresh failed: {e}")
+            return
+        with self._lock:
+            current = self._credentials
+            if current is credentials or current.expiry is None or (fresh.expiry is not None and fresh.expiry > current.expiry):
+                self._credentials = fresh
+            print("Successfully refreshed access token.")
+            self._schedule_refresh()
+
+
+# Statuses that mean the server did not process the request, safe to retry for any method.
+RETRY_ALWAYS_STATUSES = {429, 503}
+# Statuses that may be returned after the request was processed, retried only for idempotent methods.
+RETRY_IDEMPOTENT_STATUSES = {500, 502, 504}
+IDEMPOTENT_METHODS = {"GET", "DELETE", "PATCH", "PUT"}
+
+
+class AnswerChunk:
+    """
+    One typed piece of a streamed assistant answer.
+
+    Attributes:
+        kind: "text" for answer text, "thought" for the assistant's reasoning, "references"
+              for grounding references, and "end" for the last chunk of the stream.
+        text: The text of a "text" or "thought" chunk.
+        references: The grounding references of a "references" chunk.
+        state: The answer state reported with the chunk, e.g. "IN_PROGRESS" or "SUCCEEDED".
+        session: The assistant session of the answer, once the API has reported it.
+        elapsed: Seconds from the request to the arrival of the chunk.
+        timestamp: Wall-clock arrival time of the chunk, in seconds since the epoch.
+        time_to_first_chunk: Seconds from the request to the first "text" chunk, None before it.
+    """
+
+    __slots__ = ("kind", "text", "references", "state", "session", "elapsed", "timestamp", "time_to_first_chunk")
+
+    def __init__(self, kind: str, elapsed: float, time_to_first_chunk: float = None, text: str = None,
+                 references: list = None, state: str = None, session: str = None):
+        self.kind = kind
+        self.text = text
+        self.references = references
+        self.state = state
+        self.session = session
+        self.elapsed = elapsed
+        self.timestamp = time.time()
+        self.time_to_first_chunk = time_to_first_chunk
+
+    @property
+    def total_time(self) -> float:
+        """
+        Seconds from the request to the end of the stream, on the "end" chunk only.
+        """
+        return self.elapsed if self.kind == "end" else None
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return f"AnswerChunk(kind={self.kind!r}, elapsed={self.elapsed:.3f}, text={self.text!r})"
+
+
+class AnswerChunkReader:
+    """
+    Turns the raw body chunks of a :streamAssist response into AnswerChunks as they arrive.
+    """
+
+    def __init__(self, started: float, codec: JsonCodec = None):
+        """
+        Args:
+            started: The time.perf_counter() value taken when the request was sent.
+            codec: The JsonCodec decoding the response elements.
+        """
+        self.started = started
+        self.parser = JsonArrayParser(codec)
+        self.state = None
+        self.session = None
+        self.time_to_first_chunk = None
+
+    def _chunk(self, kind: str, **fields) -> AnswerChunk:
+        return AnswerChunk(kind, time.perf_counter() - self.started, self.time_to_first_chunk,
+                           state=self.state, session=self.session, **fields)
+
+    def feed(self, raw: bytes) -> list[AnswerChunk]:
+        """
+        Parses one raw body chunk.
+
+        Returns:
+            The AnswerChunks completed by this body chunk, in order.
+        """
+        chunks = []
+        for element in self.parser.feed(raw):
+            answer = element.get("answer", {})
+            self.state = answer.get("state", self.state)
+            self.session = element.get("sessionInfo", {}).get("session", self.session)
+            for reply in answer.get("replies", []):
+                grounded = reply.get("groundedContent", {})
+                content = grounded.get("content", {})
+                if "text" in content:
+                    kind = "thought" if content.get("thought") else "text"
+                    if kind == "text" and self.time_to_first_chunk is None:
+                        self.time_to_first_chunk = time.perf_counter() - self.started
+                    chunks.append(self._chunk(kind, text=content["text"]))
+                references = grounded.get("textGroundingMetadata", {}).get("references")
+                if references:
+                    chunks.append(self._chunk("references", references=references))
+        return chunks
+
+    def end(self) -> AnswerChunk:
+        return self._chunk("end")
+
+
+class RequestStats:
+    """
+    Thread-safe retry and latency counters for the requests issued by an AgentspaceManager.
+
+    Counters are aggregated per HTTP method; `last_call` holds the figures of the most recent call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_method = {}
+        self.last_call = None
+
+    def record(self, method: str, url: str, latency: float, retries: int, status: int = None, error: str = None):
+        """
+        Records the outcome of one logical call, including all of its retries.
+
+        Args:
+            method: The HTTP method of the call.
+            url: The API endpoint URL.
+            latency: Total wall-clock time of the call in seconds, backoff included.
+            retries: Number of retries performed after the first attempt.
+            status: The final HTTP status code, if a response was received.
+            error: The final error message, if the call failed.
+        """
+        with self._lock:
+            counters = self._by_method.setdefault(method, {
+                "calls": 0, "retries": 0, "errors": 0, "total_latency": 0.0, "max_latency": 0.0,
+            })
+            counters["calls"] += 1
+            counters["retries"] += retries
+            counters["errors"] += 1 if error else 0
+            counters["total_latency"] += latency
+            counters["max_latency"] = max(counters["max_latency"], latency)
+            self.last_call = {
+                "method": method, "url": url, "latency": latency,
+                "retries": retries, "status": status, "error": error,
+            }
+
+    def summary(self) -> dict:
+        """
+        Returns a snapshot of the counters per HTTP method, with the average latency added.
+        """
+        with self._lock:
+            return {
+                method: dict(counters, avg_latency=counters["total_latency"] / counters["calls"])
+                for method, counters in self._by_method.items()
+            }
+
+
+class AgentIndex:
+    """
+    An in-memory index of the agents registered in an Agentspace app, keyed by
+    displayName and by reasoning engine ID, that expires after `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        Initializes the AgentIndex.
+
+        Args:
+            ttl: Seconds after which the index is considered stale and must be rebuilt.
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_display_name = {}
+        self._by_reasoning_engine = {}
+        self._built_at = None
+
+    @staticmethod
+    def reasoning_engine_id(agent: dict) -> str:
+        """
+        Returns the reasoning engine ID an agent points to, or None for non-ADK agents.
+        """
+        definition = agent.get("adkAgentDefinition") or {}
+        engine = (definition.get("provisionedReasoningEngine") or {}).get("reasoningEngine")
+        return engine.rsplit("/", 1)[-1] if engine else None
+
+    @property
+    def stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.ttl
+
+    def rebuild(self, agents):
+        """
+        Replaces the index contents with `agents`.
+
+        Args:
+            agents: An iterable of agent resources, as returned by the API.
+        """
+        by_display_name, by_reasoning_engine = {}, {}
+        for agent in agents:
+            by_display_name.setdefault(agent.get("displayName"), []).append(agent)
+            engine_id = self.reasoning_engine_id(agent)
+            if engine_id:
+                by_reasoning_engine.setdefault(engine_id, []).append(agent)
+        with self._lock:
+            self._by_display_name = by_display_name
+            self._by_reasoning_engine = by_reasoning_engine
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """
+        Marks the index as stale so the next lookup rebuilds it.
+        """
+        with self._lock:
+            self._built_at = None
+
+    def lookup(self, display_name: str = None, reasoning_engine: str = None) -> list[dict]:
+        """
+        Returns the indexed agents matching every given criterion.
+
+        Args:
+            display_name: The agent displayName.
+            reasoning_engine: A reasoning engine ID or full resource name.
+
+        Returns:
+            The matching agent resources.
+        """
+        with self._lock:
+            if reasoning_engine is not None:
+                matches = self._by_reasoning_engine.get(reasoning_engine.rsplit("/", 1)[-1], [])
+                if display_name is not None:
+                    matches = [agent for agent in matches if agent.get("displayName") == display_name]
+                return list(matches)
+            if display_name is not None:
+                return list(self._by_display_name.get(display_name, []))
+            return [agent for agents in self._by_display_name.values() for agent in agents]
+
 
 class AgentspaceManager:
     """
@@ -11,7 +356,10 @@ class AgentspaceManager:
     using the 'requests' library for HTTP communication.
     """
 
-    def __init__(self, project_id: str, app_id: str, location: str = "global"):
+    def __init__(self, project_id: str, app_id: str, location: str = "global", credentials: CredentialProvider = None,
+                 pool_size: int = 10, timeout: tuple = (10.0, 120.0), max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, agent_index_ttl: float = 300.0,
+                 api_endpoint: str = None, json_codec: JsonCodec = None, gzip: bool = True):
         """
         Initializes the AgentspaceManager.
 
@@ -20,33 +368,79 @@ class AgentspaceManager:
             app_id: The ID of the Agentspace app.
             location: The Google Cloud location for the Agentspace resources (e.g., "global", "us-central1").
                       Defaults to "global".
+            credentials: The CredentialProvider used to authenticate requests. Pass the same
+                         provider to several managers to share one cached token. Defaults to
+                         a new provider using Application Default Credentials.
+            pool_size: Maximum number of keep-alive connections kept in the HTTP session pool.
+            timeout: The (connect, read) timeout in seconds applied to every request.
+            max_retries: Maximum number of retries for transient errors (429/5xx, connection errors).
+            backoff_base: Base delay in seconds of the jittered exponential backoff.
+            backoff_max: Upper bound in seconds of a single backoff delay.
+            agent_index_ttl: Seconds the in-memory agent index used by `find_agents` stays valid.
+            api_endpoint: Scheme and host of the Discovery Engine API, e.g. a local stand-in for
+                          benchmarks. Defaults to the public endpoint.
+            json_codec: The JsonCodec encoding requests and decoding responses. Defaults to the
+                        one picked by the JSON_CODEC env variable: orjson when installed, otherwise
+                        the standard json module.
+            gzip: Whether to ask for gzip-compressed responses. Google APIs only compress
+                  for a User-Agent that mentions gzip, so this also sets the User-Agent.
         """
         self.project_id = project_id
         self.app_id = app_id
         self.location = location
-        self.base_url = "https://discoveryengine.googleapis.com/v1alpha"
+        api_endpoint = api_endpoint or "https://discoveryengine.googleapis.com"
+        self.base_url = f"{api_endpoint.rstrip('/')}/v1alpha"
+        self.credentials = credentials or CredentialProvider()
+        self.json_codec = json_codec or JSON_CODEC
+        self.transport_headers = transport_headers(gzip)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = RequestStats()
+        self.agent_index = AgentIndex(ttl=agent_index_ttl)
+        self.session = self._create_session(pool_size)
+
+    def _create_session(self, pool_size: int):
+        session = requests.Session()
+        session.headers.update(self.transport_headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        """
+        Closes the pooled HTTP session.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def _get_access_token(self) -> str:
         try:
-            credentials, _ = google_auth.default()
-            auth_request = google_requests.Request()
-            credentials.refresh(auth_request)
-            print("Successfully refreshed identity token.")
-            return credentials.token
+            return self.credentials.get_token()
         except Exception as e:
             print(f"FATAL: Could not get Google credentials. "
                 f"Ensure you have run 'gcloud auth application-default login'. Error: {e}")
             # In a real test, you might want to exit if auth fails globally.
             return None
 
-    def _execute_request(self, method: str, url: str, data: dict = None) -> dict:
+    def _execute_request(self, method: str, url: str, data: dict = None, changes_agents: bool = False) -> dict:
         """
-        Executes an HTTP request using the requests library.
+        Executes an HTTP request through the pooled session, retrying transient errors
+        with jittered exponential backoff and recording the call in `self.stats`.
 
         Args:
             method: The HTTP method (e.g., 'POST', 'GET', 'DELETE', 'PATCH').
             url: The API endpoint URL.
             data: The JSON payload for the request.
+            changes_agents: Whether the request creates, updates or deletes an agent, which
+                            invalidates the agent index once it succeeds.
 
         Returns:
             The JSON response from the API.
@@ -56,17 +450,75 @@ class AgentspaceManager:
             "Content-Type": "application/json",
             "X-Goog-User-Project": self.project_id,
         }
-        print(self._get_access_token())
 
-        try:
-            response = requests.request(method, url, headers=headers, json=data)
-            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-            if response.text:
-                return response.json()
+        retries = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                response = self.session.request(method, url, headers=headers, data=self._encode(data), timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if retries < self.max_retries and self._is_retryable_error(method, e):
+                    time.sleep(self._backoff_delay(retries))
+                    retries += 1
+                    continue
+                self.stats.record(method, url, time.perf_counter() - started, retries, error=str(e))
+                print(f"Error executing request: {e}")
+                raise
+
+            if retries < self.max_retries and self._is_retryable_status(method, response.status_code):
+                delay = self._backoff_delay(retries, response.headers.get("Retry-After"))
+                print(f"Transient HTTP {response.status_code} from {method} {url}, retrying in {delay:.2f}s")
+                response.close()
+                time.sleep(delay)
+                retries += 1
+                continue
+
+            try:
+                response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
+            except requests.exceptions.RequestException as e:
+                self.stats.record(method, url, time.perf_counter() - started, retries, response.status_code, str(e))
+                print(f"Error executing request: {e}")
+                raise
+            self.stats.record(method, url, time.perf_counter() - started, retries, response.status_code)
+            if changes_agents:
+                self.agent_index.invalidate()
+            if response.content:
+                return self.json_codec.loads(response.content)
             return {}
-        except requests.exceptions.RequestException as e:
-            print(f"Error executing request: {e}")
-            raise
+
+    def _encode(self, data: dict) -> bytes:
+        return self.json_codec.dumps(data) if data is not None else None
+
+    def _is_retryable_status(self, method: str, status: int) -> bool:
+        if status in RETRY_ALWAYS_STATUSES:
+            return True
+        return status in RETRY_IDEMPOTENT_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+    def _is_retryable_error(self, method: str, error: Exception) -> bool:
+        # A connect timeout never reached the server; other failures are only safe to replay if idempotent.
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def _backoff_delay(self, attempt: int, retry_after: str = None) -> float:
+        """
+        Returns the delay before the next retry: the server's Retry-After (seconds or an HTTP
+        date) when it is valid, otherwise full-jitter exponential backoff. Either way the delay
+        is capped at `backoff_max`.
+        """
+        if retry_after:
+            delay = None
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    retry_at = email.utils.parsedate_to_datetime(retry_after)
+                    delay = (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds()
+                except (TypeError, ValueError):
+                    pass
+            if delay is not None and math.isfinite(delay):
+                return min(max(delay, 0.0), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
 
     def create_authorization(self, auth_id: str, client_id: str, client_secret: str, auth_uri: str, token_uri: str) -> dict:
         """
@@ -94,6 +546,86 @@ class AgentspaceManager:
         }
         return self._execute_request('POST', url, data=payload)
 
+    def update_authorization(self, auth_id: str, client_id: str, client_secret: str, auth_uri: str, token_uri: str) -> dict:
+        """
+        Updates an existing authorization resource.
+
+        Args:
+            auth_id: The ID of the authorization resource.
+            client_id: The OAuth 2.0 client ID.
+            client_secret: The OAuth 2.0 client secret.
+            auth_uri: The endpoint for obtaining an authorization code.
+            token_uri: The endpoint for exchanging an authorization code for an access token.
+
+        Returns:
+            The updated authorization resource.
+        """
+        cls_auth_id = quote_plus(auth_id)
+        url = f"{self.base_url}/projects/{self.project_id}/locations/{self.location}/authorizations/{cls_auth_id}"
+        payload = {
+            "name": f"projects/{self.project_id}/locations/{self.location}/authorizations/{auth_id}",
+            "serverSideOauth2": {
+                "clientId": client_id,
+                "clientSecret": client_secret,
+                "authorizationUri": auth_uri,
+                "tokenUri": token_uri
+            }
+        }
+        return self._execute_request('PATCH', url, data=payload)
+
+    def get_authorization(self, auth_id: str) -> dict:
+        """
+        Views an authorization resource. The client secret is never returned.
+
+        Args:
+            auth_id: The ID of the authorization resource.
+
+        Returns:
+            The authorization resource.
+        """
+        cls_auth_id = quote_plus(auth_id)
+        url = f"{self.base_url}/projects/{self.project_id}/locations/{self.location}/authorizations/{cls_auth_id}"
+        return self._execute_request('GET', url)
+
+    def list_authorizations(self, page_size: int = None, page_token: str = None) -> dict:
+        """
+        Lists the authorization resources of the project, one page at a time.
+
+        Args:
+            page_size: Maximum number of authorizations to return in the page.
+            page_token: The `nextPageToken` of a previous call, to fetch the following page.
+
+        Returns:
+            A page of authorization resources, with `nextPageToken` when more pages are available.
+        """
+        url = f"{self.base_url}/projects/{self.project_id}/locations/{self.location}/authorizations"
+        params = {}
+        if page_size:
+            params["pageSize"] = page_size
+        if page_token:
+            params["pageToken"] = page_token
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        return self._execute_request('GET', url)
+
+    def iter_authorizations(self, page_size: int = 100):
+        """
+        Iterates over all authorization resources, fetching pages lazily as they are consumed.
+
+        Args:
+            page_size: Maximum number of authorizations requested per page.
+
+        Yields:
+            Authorization resources.
+        """
+        page_token = None
+        while True:
+            page = self.list_authorizations(page_size=page_size, page_token=page_token)
+            yield from page.get("authorizations", [])
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+
     def generate_auth_uri(self, base_auth_uri: str, client_id: str, scopes: list[str]) -> str:
         """
         Generates the complete authorization URI with the necessary parameters.
@@ -183,9 +715,9 @@ class AgentspaceManager:
         if icon_uri:
             payload["icon"] = {"uri": icon_uri}
         print(payload)
-        return self._execute_request('POST', url, data=payload)
+        return self._execute_request('POST', url, data=payload, changes_agents=True)
 
-    def update_agent(self, agent_resource_name: str, display_name: str, description: str, tool_description: str, adk_deployment_id: str, adk_deployment_location: str) -> dict:
+    def update_agent(self, agent_resource_name: str, display_name: str, description: str, tool_description: str, adk_deployment_id: str, adk_deployment_location: str, icon_uri: str = None, auth_ids: list = None) -> dict:
         """
         Updates the registration of an existing agent.
 
@@ -196,6 +728,8 @@ class AgentspaceManager:
             tool_description: The description/prompt for the LLM.
             adk_deployment_id: The ID of the reasoning engine endpoint.
             adk_deployment_location: The Google Cloud location where the ADK deployment (reasoning engine) resides.
+            icon_uri: The public URI of the agent's icon.
+            auth_ids: A list of authorization resource IDs.
 
         Returns:
             The updated agent resource.
@@ -213,7 +747,11 @@ class AgentspaceManager:
                 }
             }
         }
-        return self._execute_request('PATCH', url, data=payload)
+        if auth_ids:
+            payload["authorization_config"] = {"tool_authorizations": [f"projects/{self.project_id}/locations/{self.location}/authorizations/{auth_id}" for auth_id in auth_ids]}
+        if icon_uri:
+            payload["icon"] = {"uri": icon_uri}
+        return self._execute_request('PATCH', url, data=payload, changes_agents=True)
 
     def get_agent(self, agent_resource_name: str) -> dict:
         """
@@ -228,16 +766,61 @@ class AgentspaceManager:
         url = f"{self.base_url}/{agent_resource_name}"
         return self._execute_request('GET', url)
 
-    def list_agents(self) -> dict:
+    def list_agents(self, page_size: int = None, page_token: str = None) -> dict:
         """
-        Lists all registered agents.
+        Lists registered agents, one page at a time.
+
+        Args:
+            page_size: Maximum number of agents to return in the page.
+            page_token: The `nextPageToken` of a previous call, to fetch the following page.
 
         Returns:
-            A list of agent resources.
+            A page of agent resources, with `nextPageToken` when more pages are available.
         """
         url = f"{self.base_url}/projects/{self.project_id}/locations/{self.location}/collections/default_collection/engines/{self.app_id}/assistants/default_assistant/agents"
+        params = {}
+        if page_size:
+            params["pageSize"] = page_size
+        if page_token:
+            params["pageToken"] = page_token
+        if params:
+            url = f"{url}?{urlencode(params)}"
         return self._execute_request('GET', url)
 
+    def iter_agents(self, page_size: int = 100):
+        """
+        Iterates over all registered agents, fetching pages lazily as they are consumed.
+
+        Args:
+            page_size: Maximum number of agents requested per page.
+
+        Yields:
+            Agent resources.
+        """
+        page_token = None
+        while True:
+            page = self.list_agents(page_size=page_size, page_token=page_token)
+            yield from page.get("agents", [])
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+
+    def find_agents(self, display_name: str = None, reasoning_engine: str = None) -> list[dict]:
+        """
+        Finds registered agents through the in-memory agent index, re-listing the app
+        only when the index is older than `agent_index_ttl` or was invalidated by a change.
+
+        Args:
+            display_name: The agent displayName to match.
+            reasoning_engine: The reasoning engine ID or resource name the agent must point to.
+
+        Returns:
+            The matching agent resources.
+        """
+        if self.agent_index.stale:
+            self.agent_index.rebuild(self.iter_agents())
+        return self.agent_index.lookup(display_name=display_name, reasoning_engine=reasoning_engine)
+
     def delete_agent(self, agent_resource_name: str) -> dict:
         """
         Deletes the registration of an agent.
@@ -249,30 +832,399 @@ class AgentspaceManager:
             The response from the API.
         """
         url = f"{self.base_url}/{agent_resource_name}"
-        return self._execute_request('DELETE', url)
+        return self._execute_request('DELETE', url, changes_agents=True)
 
-    def get_answers_from_agent(self, query: str, agent_resource_name: str) -> dict:
+    def get_answers_from_agent(self, query: str, agent_resource_name: str, session: str = None) -> dict:
         """
         Gets answers from an agent using the assistant API.
 
         Args:
             query: The user's query.
             agent_resource_name: The resource name of the registered agent.
+            session: The assistant session of an earlier answer (its sessionInfo.session), to
+                     ask a follow-up question in that conversation. Defaults to a new session.
 
         Returns:
             The response from the agent.
         """
-        url = f"{self.base_url}/projects/{self.project_id}/locations/{self.location}/collections/default_collection/engines/{self.app_id}/assistants/default_assistant:streamAssist"
+        url, payload = self._stream_assist_request(query, agent_resource_name, session)
+        return self._execute_request('POST', url, data=payload)
+
+    def _stream_assist_request(self, query: str, agent_resource_name: str, session: str = None) -> tuple[str, dict]:
+        assistant = f"projects/{self.project_id}/locations/{self.location}/collections/default_collection/engines/{self.app_id}/assistants/default_assistant"
         payload = {
-            "name": f"projects/{self.project_id}/locations/{self.location}/collections/default_collection/engines/{self.app_id}/assistants/default_assistant",
+            "name": assistant,
             "query": {
                 "text": query
             },
-            "session": f"projects/{self.project_id}/locations/{self.location}/collections/default_collection/engines/{self.app_id}/sessions/-",
+            "session": session or f"projects/{self.project_id}/locations/{self.location}/collections/default_collection/engines/{self.app_id}/sessions/-",
             "assistSkippingMode": "REQUEST_ASSIST",
             "answerGenerationMode": "AGENT",
             "agentsConfig": {
                 "agent": agent_resource_name
             }
         }
-        return self._execute_request('POST', url, data=payload)
\ No newline at end of file
+        return f"{self.base_url}/{assistant}:streamAssist", payload
+
+    def stream_answers_from_agent(self, query: str, agent_resource_name: str, session: str = None):
+        """
+        Streams the answer of an agent as the assistant generates it, unlike
+        `get_answers_from_agent` which returns once the whole response has arrived.
+
+        Transient errors are retried like any other call until the response starts; a
+        stream that breaks halfway raises.
+
+        Args:
+            query: The user's query.
+            agent_resource_name: The resource name of the registered agent.
+            session: The assistant session to continue, see `get_answers_from_agent`.
+
+        Yields:
+            AnswerChunks as they arrive, each with its arrival time. The last one has kind
+            "end" and carries the time to the first text chunk, the total time and the session.
+        """
+        url, payload = self._stream_assist_request(query, agent_resource_name, session)
+        headers = {
+            "Authorization": f"Bearer {self._get_access_token()}",
+            "Content-Type": "application/json",
+            "X-Goog-User-Project": self.project_id,
+        }
+
+        retries = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                response = self.session.post(url, headers=headers, data=self._encode(payload), timeout=self.timeout, stream=True)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if retries < self.max_retries and self._is_retryable_error("POST", e):
+                    time.sleep(self._backoff_delay(retries))
+                    retries += 1
+                    continue
+                self.stats.record("POST", url, time.perf_counter() - started, retries, error=str(e))
+                print(f"Error executing request: {e}")
+                raise
+            if retries < self.max_retries and self._is_retryable_status("POST", response.status_code):
+                delay = self._backoff_delay(retries, response.headers.get("Retry-After"))
+                print(f"Transient HTTP {response.status_code} from POST {url}, retrying in {delay:.2f}s")
+                response.close()
+                time.sleep(delay)
+                retries += 1
+                continue
+            break
+
+        with response:
+            try:
+                response.raise_for_status()
+                reader = AnswerChunkReader(started, self.json_codec)
+                for raw in response.iter_content(chunk_size=None):
+                    yield from reader.feed(raw)
+            except requests.exceptions.RequestException as e:
+                self.stats.record("POST", url, time.perf_counter() - started, retries, response.status_code, str(e))
+                print(f"Error executing request: {e}")
+                raise
+        self.stats.record("POST", url, time.perf_counter() - started, retries, response.status_code)
+        yield reader.end()
+
+
+class AsyncAgentspaceManager(AgentspaceManager):
+    """
+    An asyncio variant of AgentspaceManager built on httpx.AsyncClient.
+
+    It exposes the same methods as AgentspaceManager, but every API method returns an
+    awaitable. All requests share one pooled client and are bounded by a semaphore, so
+    bulk helpers such as `register_agents` or `delete_agents` run concurrently without
+    exceeding `max_concurrency` in-flight calls.
+    """
+
+    def __init__(self, project_id: str, app_id: str, location: str = "global", credentials: CredentialProvider = None,
+                 pool_size: int = 10, timeout: tuple = (10.0, 120.0), max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, agent_index_ttl: float = 300.0,
+                 max_concurrency: int = 10, api_endpoint: str = None, json_codec: JsonCodec = None, gzip: bool = True):
+        """
+        Initializes the AsyncAgentspaceManager.
+
+        Args:
+            project_id: The ID of your Google Cloud project.
+            app_id: The ID of the Agentspace app.
+            location: The Google Cloud location for the Agentspace resources. Defaults to "global".
+            credentials: The CredentialProvider used to authenticate requests.
+            pool_size: Maximum number of keep-alive connections kept by the HTTP client.
+            timeout: The (connect, read) timeout in seconds applied to every request.
+            max_retries: Maximum number of retries for transient errors (429/5xx, connection errors).
+            backoff_base: Base delay in seconds of the jittered exponential backoff.
+            backoff_max: Upper bound in seconds of a single backoff delay.
+            agent_index_ttl: Seconds the in-memory agent index used by `find_agents` stays valid.
+            max_concurrency: Maximum number of requests in flight at the same time.
+            api_endpoint: Scheme and host of the Discovery Engine API, see AgentspaceManager.
+            json_codec: The JsonCodec encoding requests and decoding responses, see AgentspaceManager.
+            gzip: Whether to ask for gzip-compressed responses, see AgentspaceManager.
+        """
+        super().__init__(project_id, app_id, location, credentials, pool_size, timeout,
+                         max_retries, backoff_base, backoff_max, agent_index_ttl, api_endpoint,
+                         json_codec, gzip)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _create_session(self, pool_size: int):
+        import httpx
+
+        connect_timeout, read_timeout = self.timeout
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            headers=self.transport_headers,
+        )
+
+    def for_app(self, app_id: str) -> "AsyncAgentspaceManager":
+        """
+        Returns a manager for another Agentspace app sharing this manager's client,
+        credentials, concurrency limit and stats (but not its agent index).
+
+        Args:
+            app_id: The ID of the other Agentspace app.
+
+        Returns:
+            An AsyncAgentspaceManager bound to `app_id`.
+        """
+        other = object.__new__(AsyncAgentspaceManager)
+        other.__dict__.update(self.__dict__)
+        other.app_id = app_id
+        other.agent_index = AgentIndex(ttl=self.agent_index.ttl)
+        return other
+
+    def close(self):
+        raise TypeError("Use 'await manager.aclose()' to close an AsyncAgentspaceManager.")
+
+    async def aclose(self):
+        """
+        Closes the pooled HTTP client.
+        """
+        await self.session.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _execute_request(self, method: str, url: str, data: dict = None, changes_agents: bool = False) -> dict:
+        """
+        Executes an HTTP request through the pooled async client, bounded by the
+        concurrency semaphore, with the same retry policy as AgentspaceManager.
+
+        Args:
+            method: The HTTP method (e.g., 'POST', 'GET', 'DELETE', 'PATCH').
+            url: The API endpoint URL.
+            data: The JSON payload for the request.
+            changes_agents: Whether the request creates, updates or deletes an agent, which
+                            invalidates the agent index once it succeeds.
+
+        Returns:
+            The JSON response from the API.
+        """
+        import httpx
+
+        async with self.semaphore:
+            headers = {
+                "Authorization": f"Bearer {await asyncio.to_thread(self._get_access_token)}",
+                "Content-Type": "application/json",
+                "X-Goog-User-Project": self.project_id,
+            }
+
+            retries = 0
+            started = time.perf_counter()
+            while True:
+                try:
+                    response = await self.session.request(method, url, headers=headers, content=self._encode(data))
+                except httpx.TransportError as e:
+                    # A failed connect never reached the server; other failures are only safe to replay if idempotent.
+                    retryable = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) or method.upper() in IDEMPOTENT_METHODS
+                    if retries < self.max_retries and retryable:
+                        await asyncio.sleep(self._backoff_delay(retries))
+                        retries += 1
+                        continue
+                    self.stats.record(method, url, time.perf_counter() - started, retries, error=str(e))
+                    print(f"Error executing request: {e}")
+                    raise
+
+                if retries < self.max_retries and self._is_retryable_status(method, response.status_code):
+                    delay = self._backoff_delay(retries, response.headers.get("Retry-After"))
+                    print(f"Transient HTTP {response.status_code} from {method} {url}, retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    retries += 1
+                    continue
+
+                try:
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    self.stats.record(method, url, time.perf_counter() - started, retries, response.status_code, str(e))
+                    print(f"Error executing request: {e}")
+                    raise
+                self.stats.record(method, url, time.perf_counter() - started, retries, response.status_code)
+                if changes_agents:
+                    self.agent_index.invalidate()
+                if response.content:
+                    return self.json_codec.loads(response.content)
+                return {}
+
+    async def aiter_agents(self, page_size: int = 100):
+        """
+        Asynchronously iterates over all registered agents, fetching pages lazily.
+
+        Args:
+            page_size: Maximum number of agents requested per page.
+
+        Yields:
+            Agent resources.
+        """
+        page_token = None
+        while True:
+            page = await self.list_agents(page_size=page_size, page_token=page_token)
+            for agent in page.get("agents", []):
+                yield agent
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+
+    async def aiter_authorizations(self, page_size: int = 100):
+        """
+        Asynchronously iterates over all authorization resources, fetching pages lazily.
+
+        Args:
+            page_size: Maximum number of authorizations requested per page.
+
+        Yields:
+            Authorization resources.
+        """
+        page_token = None
+        while True:
+            page = await self.list_authorizations(page_size=page_size, page_token=page_token)
+            for authorization in page.get("authorizations", []):
+                yield authorization
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+
+    def iter_authorizations(self, page_size: int = 100):
+        raise TypeError("Use 'async for authorization in manager.aiter_authorizations()' with an AsyncAgentspaceManager.")
+
+    def iter_agents(self, page_size: int = 100):
+        raise TypeError("Use 'async for agent in manager.aiter_agents()' with an AsyncAgentspaceManager.")
+
+    def stream_answers_from_agent(self, query: str, agent_resource_name: str, session: str = None):
+        raise TypeError("Use 'async for chunk in manager.astream_answers_from_agent()' with an AsyncAgentspaceManager.")
+
+    async def astream_answers_from_agent(self, query: str, agent_resource_name: str, session: str = None):
+        """
+        Asynchronously streams the answer of an agent, see AgentspaceManager.stream_answers_from_agent.
+        The stream holds one slot of the concurrency limit until it ends.
+
+        Yields:
+            AnswerChunks as they arrive, the last one with kind "end".
+        """
+        import httpx
+
+        url, payload = self._stream_assist_request(query, agent_resource_name, session)
+        async with self.semaphore:
+            headers = {
+                "Authorization": f"Bearer {await asyncio.to_thread(self._get_access_token)}",
+                "Content-Type": "application/json",
+                "X-Goog-User-Project": self.project_id,
+            }
+
+            retries = 0
+            started = time.perf_counter()
+            while True:
+                request = self.session.build_request("POST", url, headers=headers, content=self._encode(payload))
+                try:
+                    response = await self.session.send(request, stream=True)
+                except httpx.TransportError as e:
+                    if retries < self.max_retries and isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                        await asyncio.sleep(self._backoff_delay(retries))
+                        retries += 1
+                        continue
+                    self.stats.record("POST", url, time.perf_counter() - started, retries, error=str(e))
+                    print(f"Error executing request: {e}")
+                    raise
+                if retries < self.max_retries and self._is_retryable_status("POST", response.status_code):
+                    delay = self._backoff_delay(retries, response.headers.get("Retry-After"))
+                    print(f"Transient HTTP {response.status_code} from POST {url}, retrying in {delay:.2f}s")
+                    await response.aclose()
+                    await asyncio.sleep(delay)
+                    retries += 1
+                    continue
+                break
+
+            try:
+                response.raise_for_status()
+                reader = AnswerChunkReader(started, self.json_codec)
+                async for raw in response.aiter_bytes():
+                    for chunk in reader.feed(raw):
+                        yield chunk
+            except httpx.HTTPError as e:
+                self.stats.record("POST", url, time.perf_counter() - started, retries, response.status_code, str(e))
+                print(f"Error executing request: {e}")
+                raise
+            finally:
+                await response.aclose()
+            self.stats.record("POST", url, time.perf_counter() - started, retries, response.status_code)
+            yield reader.end()
+
+    async def find_agents(self, display_name: str = None, reasoning_engine: str = None) -> list[dict]:
+        """
+        Finds registered agents through the in-memory agent index. See AgentspaceManager.find_agents.
+        """
+        if self.agent_index.stale:
+            self.agent_index.rebuild([agent async for agent in self.aiter_agents()])
+        return self.agent_index.lookup(display_name=display_name, reasoning_engine=reasoning_engine)
+
+    async def gather(self, calls, return_exceptions: bool = False) -> list:
+        """
+        Runs API calls concurrently, bounded by the manager's concurrency limit.
+
+        Args:
+            calls: An iterable of awaitables returned by this manager (or by `for_app` siblings).
+            return_exceptions: Whether failures are returned in place of results instead of raised.
+
+        Returns:
+            The results in the order of `calls`.
+        """
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+    async def register_agents(self, agents: list[dict], return_exceptions: bool = False) -> list:
+        """
+        Registers several agents concurrently.
+
+        Args:
+            agents: A list of keyword-argument dicts for `register_agent`.
+            return_exceptions: Whether failures are returned in place of results instead of raised.
+
+        Returns:
+            The created agent resources, in the order of `agents`.
+        """
+        return await self.gather((self.register_agent(**agent) for agent in agents), return_exceptions)
+
+    async def get_agents(self, agent_resource_names: list[str], return_exceptions: bool = False) -> list:
+        """
+        Fetches several registered agents concurrently.
+
+        Args:
+            agent_resource_names: The resource names of the agents to view.
+            return_exceptions: Whether failures are returned in place of results instead of raised.
+
+        Returns:
+            The agent resources, in the order of `agent_resource_names`.
+        """
+        return await self.gather((self.get_agent(name) for name in agent_resource_names), return_exceptions)
+
+    async def delete_agents(self, agent_resource_names: list[str], return_exceptions: bool = False) -> list:
+        """
+        Deletes several agent registrations concurrently.
+
+        Args:
+            agent_resource_names: The resource names of the agents to delete.
+            return_exceptions: Whether failures are returned in place of results instead of raised.
+
+        Returns:
+            The API responses, in the order of `agent_resource_names`.
+        """
+        return await self.gather((self.delete_agent(name) for name in agent_resource_names), return_exceptions)
@@ -0,0 +1,99 @@
+"""
+JSON codec and transport compression: CPU of encoding :streamAssist requests and parsing
+their streamed responses with the standard json module against orjson, and the response
+bytes per query with and without gzip.
+"""
+import gzip
+import importlib.util
+import json
+import random
+import uuid
+
+import pytest
+
+import datastore_service
+from discovery_common import JsonArrayParser, JsonCodec, StreamAssistExtractor
+from fake_discovery_engine import FakeDiscoveryEngine
+
+PROJECT_ID, LOCATION, DATA_STORE_ID = "bench-project", "global", "bench-datastore"
+CODECS = ["json", pytest.param("orjson", marks=pytest.mark.skipif(importlib.util.find_spec("orjson") is None,
+                                                                  reason="orjson is not installed"))]
+
+
+def realistic_body(chunks: int = 40, seed: int = 5) -> bytes:
+    """
+    A :streamAssist response shaped like a real one: varied answer text, grounding
+    references, non-ASCII characters and a session.
+    """
+    rng = random.Random(seed)
+    words = ["missão", "gasoduto", "transporte", "contrato", "Bolívia", "capacidade", "operação", "segurança",
+             "regulação", "tarifa", "manutenção", "relatório", "TBG", "2024", "ANP", "volume", "m³/dia", "ponto"]
+    elements = []
+    for i in range(chunks):
+        reply = {"groundedContent": {"content": {"text": " ".join(rng.choice(words) for _ in range(30))}}}
+        if i == chunks - 1:
+            reply["groundedContent"]["textGroundingMetadata"] = {"references": [
+                {"documentMetadata": {"title": f"Relatório anual {n}", "uri": f"gs://bench-docs/relatorio-{n}.pdf",
+                                      "document": f"projects/{PROJECT_ID}/locations/global/dataStores/d/branches/0/documents/{uuid.UUID(int=n)}"}}
+                for n in range(5)
+            ]}
+        element = {"answer": {"state": "IN_PROGRESS" if i < chunks - 1 else "SUCCEEDED", "replies": [reply]}}
+        if i == 0:
+            element["sessionInfo"] = {"session": f"projects/{PROJECT_ID}/locations/global/collections/c/engines/e/sessions/1"}
+        elements.append(element)
+    return json.dumps(elements, ensure_ascii=False).encode()
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def bench_codec_decode_response(bench, codec):
+    # Whole bodies, as :answer and the manager's CRUD responses are decoded
+    json_codec = JsonCodec(codec)
+    body = realistic_body()
+    stats = bench(lambda i: json_codec.loads(body), iterations=2000)
+    stats["body_bytes"] = len(body)
+    stats["gzip_bytes"] = len(gzip.compress(body))
+    assert stats["errors"] == 0
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def bench_codec_parse_stream_assist(bench, codec):
+    json_codec = JsonCodec(codec)
+    body = realistic_body()
+    chunks = [body[i:i + 1024] for i in range(0, len(body), 1024)]
+
+    def parse(i):
+        parser, extractor = JsonArrayParser(json_codec), StreamAssistExtractor()
+        for chunk in chunks:
+            for element in parser.feed(chunk):
+                extractor.feed(element)
+        assert extractor.result().references
+
+    # Scanning for element boundaries dominates here, decoding the elements is the smaller part
+    stats = bench(parse, iterations=500)
+    assert stats["errors"] == 0
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def bench_codec_encode_request(bench, codec):
+    json_codec = JsonCodec(codec)
+    payload = {
+        "query": {"text": "Qual a missão da TBG e qual é a capacidade do gasoduto Bolívia-Brasil?"},
+        "session": f"projects/{PROJECT_ID}/locations/global/collections/default_collection/engines/e/sessions/-",
+        "toolsSpec": {"vertexAiSearchSpec": {"dataStoreSpecs": [{"dataStore": f"projects/{PROJECT_ID}/locations/global/dataStores/d"}]}},
+    }
+    stats = bench(lambda i: json_codec.dumps(payload), iterations=5000)
+    stats["body_bytes"] = len(json_codec.dumps(payload))
+    assert stats["errors"] == 0
+
+
+@pytest.mark.parametrize("compressed", [True, False], ids=["gzip", "identity"])
+def bench_stream_assist_wire_bytes(bench, monkeypatch, compressed):
+    monkeypatch.setattr(datastore_service, "DISCOVERY_ENGINE_GZIP", compressed)
+    with FakeDiscoveryEngine(chunks=20, chunk_size=300, references=5, seed=6) as fake:
+        monkeypatch.setattr(datastore_service, "DISCOVERY_ENGINE_API_ENDPOINT", fake.url)
+        service = datastore_service.DatastoreService(access_token="bench-token")
+        stats = bench(lambda i: service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, f"wire {i} {uuid.uuid4().hex}"),
+                      iterations=50)
+        # The warm-up calls are served by the fake too
+        stats["bytes_per_query"] = fake.bytes_sent / fake.calls["streamAssist"]
+    assert stats["errors"] == 0
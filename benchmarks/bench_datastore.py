@@ -0,0 +1,92 @@
+"""
+DatastoreService against the fake Discovery Engine: uncached, concurrent and cached
+:streamAssist and :answer calls, near-duplicate cache hits, plus raw JSON stream parsing
+throughput.
+"""
+import json
+import types
+import uuid
+
+import pytest
+
+import datastore_service
+import RAG_app.agent as agent
+from discovery_common import JsonArrayParser
+
+PROJECT_ID, LOCATION, DATA_STORE_ID = "bench-project", "global", "bench-datastore"
+
+
+@pytest.fixture
+def service(monkeypatch, fake_discovery_engine):
+    monkeypatch.setattr(datastore_service, "DISCOVERY_ENGINE_API_ENDPOINT", fake_discovery_engine.url)
+    return datastore_service.DatastoreService(access_token="bench-token")
+
+
+def unique_query(i):
+    return f"bench query {i} {uuid.uuid4().hex}"
+
+
+def bench_stream_assist_uncached(bench, service):
+    def call(i):
+        result = service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, unique_query(i))
+        assert result.text and len(result.references) == 2
+
+    stats = bench(call, iterations=50)
+    assert stats["errors"] == 0
+
+
+def bench_stream_assist_concurrent(bench, service):
+    # 8 matches the initial adaptive concurrency limit; more calls in flight are shed by design
+    stats = bench(lambda i: service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, unique_query(i)),
+                  iterations=200, concurrency=8)
+    assert stats["errors"] == 0
+
+
+def bench_stream_assist_cached(bench, service):
+    service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, "cached bench query")
+    stats = bench(lambda i: service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, "cached bench query"),
+                  iterations=1000)
+    assert stats["errors"] == 0
+
+
+def bench_stream_assist_near_duplicate(bench, service):
+    service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, "Qual a missão da TBG?")
+    hits = datastore_service.SEMANTIC_CACHE.stats()["hits"]
+    # Paraphrases miss the exact cache and are answered by the near-duplicate one
+    paraphrases = ["qual é a missao da TBG", "Qual é a missão da TBG?", "QUAL E A MISSAO DA TBG"]
+    stats = bench(lambda i: service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, paraphrases[i % 3]),
+                  iterations=1000)
+    assert stats["errors"] == 0 and datastore_service.SEMANTIC_CACHE.stats()["hits"] - hits >= 1000
+
+
+def bench_answer_uncached(bench, service):
+    def call(i):
+        assert service.search_datastore(PROJECT_ID, LOCATION, DATA_STORE_ID, unique_query(i))
+
+    stats = bench(call, iterations=50)
+    assert stats["errors"] == 0
+
+
+def bench_search_tasks(bench, monkeypatch, fake_discovery_engine):
+    monkeypatch.setattr(datastore_service, "DISCOVERY_ENGINE_API_ENDPOINT", fake_discovery_engine.url)
+    tool_context = types.SimpleNamespace(state={f"temp:{agent.AUTH_NAME}": "bench-token"}, user_id="bench-user")
+
+    def call(i):
+        assert "answer" in agent.search_tasks(unique_query(i), tool_context)
+
+    stats = bench(call, iterations=50, concurrency=4)
+    assert stats["errors"] == 0
+
+
+def bench_json_stream_parser(bench):
+    element = {"answer": {"state": "IN_PROGRESS", "replies": [{"groundedContent": {"content": {"text": "lorem ipsum " * 40}}}]}}
+    body = ("[" + ",".join(json.dumps(element) for _ in range(2000)) + "]").encode()
+    chunks = [body[i:i + 4096] for i in range(0, len(body), 4096)]
+
+    def parse(i):
+        parser = JsonArrayParser()
+        assert sum(len(parser.feed(chunk)) for chunk in chunks) == 2000
+
+    stats = bench(parse, iterations=20)
+    stats["mb_per_s"] = len(body) / 1e6 / stats["mean"]
+    assert stats["errors"] == 0
@@ -0,0 +1,103 @@
+"""
+AgentspaceManager and AsyncAgentspaceManager against the fake agents and authorizations
+CRUD: paginated listing, indexed lookups, registration round trips, retries and the
+time to first chunk of streamed answers.
+"""
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from agentspace_manager import AgentspaceManager, AsyncAgentspaceManager
+from fake_discovery_engine import FakeDiscoveryEngine
+
+AGENTS = 300
+
+
+class StaticCredentials:
+    def get_token(self):
+        return "bench-token"
+
+
+def agent_spec(i):
+    return dict(
+        display_name=f"bench agent {i}",
+        description="Benchmark agent",
+        tool_description="Benchmark agent",
+        adk_deployment_id=str(1000 + i),
+        adk_deployment_location="us-central1",
+        auth_ids=["bench-auth"],
+    )
+
+
+def manager(endpoint, cls=AgentspaceManager, **kwargs):
+    return cls(project_id="123", app_id="bench-app", credentials=StaticCredentials(), api_endpoint=endpoint,
+               backoff_base=0.001, backoff_max=0.01, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def populated():
+    with FakeDiscoveryEngine(first_byte_delay=0.002, seed=2) as fake, manager(fake.url) as client:
+        # register_agent prints its payload
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(AGENTS):
+                client.register_agent(**agent_spec(i))
+        yield fake
+
+
+def bench_iter_agents(bench, populated):
+    with manager(populated.url) as client:
+        stats = bench(lambda i: sum(1 for _ in client.iter_agents(page_size=100)) == AGENTS or 1 / 0, iterations=30)
+    assert stats["errors"] == 0
+
+
+def bench_find_agents_indexed(bench, populated):
+    with manager(populated.url) as client:
+        stats = bench(lambda i: client.find_agents(display_name=f"bench agent {i % AGENTS}") or 1 / 0, iterations=1000)
+    assert stats["errors"] == 0
+
+
+def bench_register_and_delete(bench, populated):
+    def round_trip(i):
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent = client.register_agent(**agent_spec(AGENTS + i + 10))
+        client.delete_agent(agent["name"])
+
+    with manager(populated.url) as client:
+        stats = bench(round_trip, iterations=50, concurrency=4)
+    assert stats["errors"] == 0
+
+
+def bench_async_register_agents(bench, populated):
+    async def batch(i):
+        async with manager(populated.url, AsyncAgentspaceManager, max_concurrency=10) as client:
+            with contextlib.redirect_stdout(io.StringIO()):
+                agents = await client.register_agents([agent_spec(10000 + i * 20 + n) for n in range(20)])
+            await client.delete_agents([agent["name"] for agent in agents])
+
+    stats = bench.run_async(batch, iterations=10)
+    assert stats["errors"] == 0
+
+
+def bench_list_with_transient_errors(bench):
+    # One call in five fails with 503; retries must hide every failure from the caller
+    with FakeDiscoveryEngine(error_rate=0.2, error_status=503, seed=3) as fake, manager(fake.url) as client:
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = bench(lambda i: client.list_agents(page_size=10), iterations=100)
+    assert stats["errors"] == 0
+
+
+def bench_stream_answers_time_to_first_chunk(bench):
+    # The first chunk arrives after first_byte_delay, the full answer 4 chunk delays later
+    with FakeDiscoveryEngine(chunks=5, first_byte_delay=0.02, chunk_delay=0.02, seed=4) as fake, manager(fake.url) as client:
+        first_chunks = []
+
+        def probe(i):
+            chunks = list(client.stream_answers_from_agent(f"probe {i}", "agents/bench"))
+            assert chunks[-1].kind == "end" and chunks[-1].time_to_first_chunk < chunks[-1].total_time
+            first_chunks.append(chunks[-1].time_to_first_chunk)
+
+        stats = bench(probe, iterations=30)
+    stats["time_to_first_chunk_p50"] = sorted(first_chunks)[len(first_chunks) // 2]
+    assert stats["errors"] == 0
@@ -0,0 +1,46 @@
+"""
+The no-LLM ragAgent end to end through an ADK Runner: concurrent sessions streaming from
+the fake :streamAssist, and sessions answered from the shared answer cache.
+"""
+import uuid
+
+import pytest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+import no_llm.agent as agent
+
+APP_NAME = "bench"
+
+
+@pytest.fixture
+def run_query(monkeypatch, fake_discovery_engine):
+    monkeypatch.setattr(agent, "DISCOVERY_ENGINE_API_ENDPOINT", fake_discovery_engine.url)
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent.root_agent, app_name=APP_NAME, session_service=session_service)
+
+    async def run(user_id, query):
+        # The user's OAuth token normally arrives in temp: state, which Runner sessions do not persist;
+        # its expiry is given so the cache does not introspect the fake token
+        agent.USER_TOKENS.put(user_id, "bench-token", expires_in=3600)
+        session = await session_service.create_session(app_name=APP_NAME, user_id=user_id)
+        message = types.Content(role="user", parts=[types.Part(text=query)])
+        final = None
+        async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=message):
+            if event.turn_complete:
+                final = event.content.parts[0].text
+        assert final
+        return final
+
+    return run
+
+
+def bench_rag_agent_uncached(bench, run_query):
+    stats = bench.run_async(lambda i: run_query(f"user-{i}", f"query {uuid.uuid4().hex}"), iterations=100, concurrency=20)
+    assert stats["errors"] == 0
+
+
+def bench_rag_agent_cached(bench, run_query):
+    stats = bench.run_async(lambda i: run_query("user-cached", "the same question"), iterations=200, concurrency=20)
+    assert stats["errors"] == 0
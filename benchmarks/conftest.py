@@ -0,0 +1,179 @@
+"""
+Shared fixtures of the benchmark suite: the fake Discovery Engine server and `bench`,
+a small pytest-benchmark style runner reporting throughput, latency percentiles and peak
+memory of a workload. The test_*.py files next to the benchmarks check behavior against
+the same fake.
+
+Results are written to BENCH_RESULTS (benchmarks/bench_results.json by default). With
+BENCH_BASELINE pointing to an earlier results file, a benchmark fails when its p95
+latency grows beyond BENCH_TOLERANCE times the baseline, so regressions show up in CI.
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# The agent modules read their configuration at import time
+os.environ.setdefault("MODEL", "gemini-2.5-flash")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "bench-project")
+os.environ.setdefault("DATASTORE_LOCATION", "global")
+os.environ.setdefault("DATASTORE_ID", "bench-datastore")
+os.environ.setdefault("AGENTSPACE_APP_ID_SEARCH", "bench-app")
+os.environ.setdefault("AGENT_AUTH_OBJECT_ID", "bench-auth")
+
+from fake_discovery_engine import FakeDiscoveryEngine  # noqa: E402
+
+BENCH_RESULTS = os.getenv("BENCH_RESULTS", os.path.join(BENCH_DIR, "bench_results.json"))
+BENCH_BASELINE = os.getenv("BENCH_BASELINE")
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "1.5"))
+
+_results = {}
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Bench:
+    """
+    Runs a workload a number of times, optionally concurrently, and records its statistics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = None
+
+    def _summarize(self, latencies, errors, elapsed, peak_memory, **extra):
+        ordered = sorted(latencies)
+        self.stats = dict(
+            calls=len(latencies) + errors,
+            errors=errors,
+            throughput=len(latencies) / elapsed if elapsed else 0.0,
+            mean=statistics.fmean(ordered) if ordered else None,
+            p50=_percentile(ordered, 50) if ordered else None,
+            p95=_percentile(ordered, 95) if ordered else None,
+            p99=_percentile(ordered, 99) if ordered else None,
+            max=ordered[-1] if ordered else None,
+            peak_memory_kb=peak_memory / 1024,
+            **extra,
+        )
+        _results[self.name] = self.stats
+        _check_baseline(self.name, self.stats)
+        return self.stats
+
+    def __call__(self, fn, iterations: int = 50, concurrency: int = 1, warmup: int = 2) -> dict:
+        """
+        Calls `fn(i)` `iterations` times on `concurrency` threads, after a warm-up round of
+        `warmup` (at least `concurrency`) calls whose peak memory is traced. Memory is not
+        traced during the timed calls, tracemalloc would inflate their latency.
+
+        Returns:
+            The statistics: throughput (calls/s), latency mean/p50/p95/p99/max (s), errors
+            and peak traced memory of the warm-up round (KiB).
+        """
+
+        def timed(i):
+            started = time.perf_counter()
+            fn(i)
+            return time.perf_counter() - started
+
+        def run(indexes):
+            latencies, errors = [], 0
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for future in [pool.submit(timed, i) for i in indexes]:
+                    try:
+                        latencies.append(future.result())
+                    except Exception:
+                        errors += 1
+            return latencies, errors
+
+        tracemalloc.start()
+        run(range(-max(warmup, concurrency), 0))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        latencies, errors = run(range(iterations))
+        elapsed = time.perf_counter() - started
+        return self._summarize(latencies, errors, elapsed, peak, concurrency=concurrency)
+
+    def run_async(self, coro_fn, iterations: int = 50, concurrency: int = 1, warmup: int = 2) -> dict:
+        """
+        Awaits `coro_fn(i)` `iterations` times with at most `concurrency` in flight, in one
+        event loop, after a traced warm-up round as in `__call__`.
+        """
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def timed(i):
+                async with semaphore:
+                    started = time.perf_counter()
+                    await coro_fn(i)
+                    return time.perf_counter() - started
+
+            tracemalloc.start()
+            await asyncio.gather(*(timed(i) for i in range(-max(warmup, concurrency), 0)), return_exceptions=True)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(timed(i) for i in range(iterations)), return_exceptions=True)
+            return outcomes, time.perf_counter() - started, peak
+
+        outcomes, elapsed, peak = asyncio.run(run())
+        latencies = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+        return self._summarize(latencies, len(outcomes) - len(latencies), elapsed, peak, concurrency=concurrency)
+
+
+def _check_baseline(name, stats):
+    if not BENCH_BASELINE or stats["p95"] is None:
+        return
+    with open(BENCH_BASELINE) as f:
+        baseline = json.load(f).get(name)
+    if baseline and baseline.get("p95"):
+        assert stats["p95"] <= baseline["p95"] * BENCH_TOLERANCE, (
+            f"{name}: p95 {stats['p95'] * 1000:.1f} ms regressed beyond {BENCH_TOLERANCE}x "
+            f"the baseline {baseline['p95'] * 1000:.1f} ms"
+        )
+
+
+@pytest.fixture
+def bench(request):
+    return Bench(request.node.name)
+
+
+@pytest.fixture(scope="session")
+def fake_discovery_engine():
+    # Realistic shape, scaled down: a short time to first byte and a few streamed chunks
+    with FakeDiscoveryEngine(chunks=4, first_byte_delay=0.01, chunk_delay=0.005, seed=1) as fake:
+        yield fake
+
+
+def pytest_sessionfinish(session):
+    if not _results:
+        return
+    with open(BENCH_RESULTS, "w") as f:
+        json.dump(_results, f, indent=2, sort_keys=True)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    terminalreporter.write_line(f"{'name':<44}{'calls':>7}{'err':>5}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak KiB':>10}")
+    for name, stats in _results.items():
+        ms = lambda value: f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+        terminalreporter.write_line(
+            f"{name:<44}{stats['calls']:>7}{stats['errors']:>5}{stats['throughput']:>9.1f}"
+            f"{ms(stats['p50'])}{ms(stats['p95'])}{ms(stats['p99'])}{stats['peak_memory_kb']:>10.0f}"
+        )
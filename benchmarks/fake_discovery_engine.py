@@ -0,0 +1,366 @@
+"""
+A local stand-in for the Discovery Engine endpoints used by this project, so performance
+can be measured without calling Google:
+
+- `...:streamAssist` streams a JSON array in chunked transfer encoding, one answer chunk
+  per array element, like the real assistant. A request for a new session ("sessions/-")
+  gets one reported in sessionInfo; an unknown session is answered with 404.
+- `...:answer` returns a single JSON answer.
+- The agents and authorizations CRUD used by AgentspaceManager, kept in memory and
+  paginated with pageSize/pageToken.
+
+Like Google APIs, responses are gzip-compressed when the request accepts gzip and its
+User-Agent mentions gzip; streamed chunks are flushed one by one. `bytes_sent` counts the
+response body bytes on the wire.
+
+Latency, jitter and error injection are configurable. Point the agents at it with
+DISCOVERY_ENGINE_API_ENDPOINT and AgentspaceManager with its `api_endpoint` argument, or
+start it in-process:
+
+    with FakeDiscoveryEngine(chunks=5, chunk_delay=0.05) as fake:
+        os.environ["DISCOVERY_ENGINE_API_ENDPOINT"] = fake.url
+
+    python benchmarks/fake_discovery_engine.py --port 8089 --chunk-delay 0.2
+"""
+import argparse
+import http.server
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+_AGENTS_PATH = re.compile(r"^/v1alpha/(?P<parent>projects/[^/]+/locations/[^/]+/collections/[^/]+/engines/[^/]+/assistants/[^/]+)/agents(?:/(?P<agent_id>[^/]+))?$")
+_AUTHORIZATIONS_PATH = re.compile(r"^/v1alpha/(?P<parent>projects/[^/]+/locations/[^/]+)/authorizations(?:/(?P<auth_id>[^/]+))?$")
+
+
+class FakeDiscoveryEngine:
+    """
+    The stand-in server. It runs on a background thread and serves every request on its own
+    thread, so concurrent clients see concurrent (not queued) latencies.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, chunks: int = 3, chunk_size: int = 64,
+                 first_byte_delay: float = 0.0, chunk_delay: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, references: int = 2, seed: int = None,
+                 gzip: bool = True):
+        """
+        Initializes the server without starting it.
+
+        Args:
+            host: The interface to listen on.
+            port: The port to listen on, 0 picks a free one.
+            chunks: Answer chunks streamed per :streamAssist call.
+            chunk_size: Characters of text in each answer chunk.
+            first_byte_delay: Seconds before the response headers are sent.
+            chunk_delay: Seconds between two streamed chunks.
+            jitter: Each delay is multiplied by a random factor in [1 - jitter, 1 + jitter].
+            error_rate: Fraction of calls answered with `error_status` instead.
+            error_status: The HTTP status of injected errors, e.g. 429 or 503.
+            references: Grounding references attached to each streamed answer.
+            seed: Seed of the latency and error randomness, for repeatable runs.
+            gzip: Whether to compress the responses of clients asking for gzip.
+        """
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.first_byte_delay = first_byte_delay
+        self.chunk_delay = chunk_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.references = references
+        self.gzip = gzip
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.agents = {}
+        self.authorizations = {}
+        self.sessions = {}
+        self.calls = {}
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeDiscoveryEngine":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-discovery-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+        with self._lock:
+            factor = self._random.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1.0
+        time.sleep(seconds * factor)
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def count(self, kind: str):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def count_bytes(self, size: int):
+        with self._lock:
+            self.bytes_sent += size
+
+    def next_id(self) -> str:
+        with self._lock:
+            return str(next(self._ids))
+
+    def stream_elements(self, query: str):
+        """
+        Yields the streamAssist response elements answering `query`.
+        """
+        text = (query + " ") * (self.chunk_size // (len(query) + 1) + 1)
+        for i in range(self.chunks):
+            reply = {"groundedContent": {"content": {"text": f"{i}:{text[:self.chunk_size]}"}}}
+            if i == self.chunks - 1 and self.references:
+                reply["groundedContent"]["textGroundingMetadata"] = {"references": [
+                    {"documentMetadata": {"title": f"Doc {n}", "uri": f"https://docs.example.com/{n}", "document": f"documents/{n}"}}
+                    for n in range(self.references)
+                ]}
+            yield {"answer": {"state": "IN_PROGRESS" if i < self.chunks - 1 else "SUCCEEDED", "replies": [reply]}}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Like Google front ends: small streamed chunks are not held back on reused connections
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                return json.loads(raw) if raw else {}
+
+            def _compressor(self):
+                accepts = "gzip" in self.headers.get("Accept-Encoding", "") and "gzip" in self.headers.get("User-Agent", "")
+                if fake.gzip and accepts:
+                    self.send_header("Content-Encoding", "gzip")
+                    return zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+                return None
+
+            def _send_json(self, status: int, payload: dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                compressor = self._compressor()
+                if compressor:
+                    body = compressor.compress(body) + compressor.flush()
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                fake.count_bytes(len(body))
+
+            def _send_error(self, status: int, message: str):
+                self._send_json(status, {"error": {"code": status, "message": message}})
+
+            def _write_chunk(self, data: bytes, compressor=None, last: bool = False):
+                if compressor:
+                    data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+                fake.count_bytes(len(data))
+
+            def _inject(self, kind: str) -> bool:
+                fake.count(kind)
+                fake.sleep(fake.first_byte_delay)
+                if fake.should_fail():
+                    self._send_error(fake.error_status, "Injected error")
+                    return True
+                return False
+
+            def _stream_assist(self, body):
+                query = body.get("query", {}).get("text", "")
+                session = body.get("session")
+                if session and session.endswith("/-"):
+                    session = session[:-1] + fake.next_id()
+                elif session and session not in fake.sessions:
+                    return self._send_error(404, f"{session} not found")
+                if session:
+                    # Turns answered in each session, so benchmarks can check the affinity
+                    with fake._lock:
+                        fake.sessions[session] = fake.sessions.get(session, 0) + 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                compressor = self._compressor()
+                self.end_headers()
+                try:
+                    self._write_chunk(b"[", compressor)
+                    for i, element in enumerate(fake.stream_elements(query)):
+                        if i:
+                            fake.sleep(fake.chunk_delay)
+                        elif session:
+                            element["sessionInfo"] = {"session": session}
+                        self._write_chunk((("," if i else "") + json.dumps(element)).encode(), compressor)
+                    self._write_chunk(b"]", compressor, last=True)
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading the stream, e.g. a probe that only wanted the first chunk
+                    self.close_connection = True
+
+            def _answer(self, body):
+                query = body.get("query", {}).get("text", "")
+                fake.sleep(fake.chunk_delay * fake.chunks)
+                self._send_json(200, {"answer": {"state": "SUCCEEDED", "answerText": " ".join(
+                    element["answer"]["replies"][0]["groundedContent"]["content"]["text"] for element in fake.stream_elements(query)
+                )}})
+
+            def _page(self, items: list, key: str):
+                params = parse_qs(urlsplit(self.path).query)
+                size = int(params.get("pageSize", ["50"])[0])
+                start = int(params.get("pageToken", ["0"])[0])
+                page = {key: items[start:start + size]}
+                if start + size < len(items):
+                    page["nextPageToken"] = str(start + size)
+                self._send_json(200, page)
+
+            def _agents(self, method, match, body):
+                parent, agent_id = match.group("parent"), match.group("agent_id")
+                name = f"{parent}/agents/{agent_id}"
+                if method == "GET" and agent_id is None:
+                    with fake._lock:
+                        agents = [agent for agent in fake.agents.values() if agent["name"].startswith(parent + "/")]
+                    return self._page(agents, "agents")
+                if method == "POST" and agent_id is None:
+                    agent = _camel_case(body)
+                    agent["name"] = f"{parent}/agents/{fake.next_id()}"
+                    with fake._lock:
+                        fake.agents[agent["name"]] = agent
+                    return self._send_json(200, agent)
+                with fake._lock:
+                    agent = fake.agents.get(name)
+                    if agent is not None and method == "PATCH":
+                        agent.update(_camel_case(body))
+                    if agent is not None and method == "DELETE":
+                        del fake.agents[name]
+                if agent is None:
+                    return self._send_error(404, f"{name} not found")
+                return self._send_json(200, {} if method == "DELETE" else agent)
+
+            def _authorizations(self, method, match, body):
+                parent, auth_id = match.group("parent"), match.group("auth_id")
+                if method == "GET" and auth_id is None:
+                    with fake._lock:
+                        authorizations = [dict(auth, serverSideOauth2={k: v for k, v in auth.get("serverSideOauth2", {}).items() if k != "clientSecret"})
+                                          for auth in fake.authorizations.values()]
+                    return self._page(authorizations, "authorizations")
+                if method == "POST" and auth_id is None:
+                    auth_id = parse_qs(urlsplit(self.path).query).get("authorizationId", [fake.next_id()])[0]
+                    name = f"{parent}/authorizations/{auth_id}"
+                    with fake._lock:
+                        if name in fake.authorizations:
+                            return self._send_error(409, f"{name} already exists")
+                        fake.authorizations[name] = dict(body, name=name)
+                    return self._send_json(200, fake.authorizations[name])
+                name = f"{parent}/authorizations/{auth_id}"
+                with fake._lock:
+                    auth = fake.authorizations.get(name)
+                    if auth is not None and method == "PATCH":
+                        auth.update(body)
+                    if auth is not None and method == "DELETE":
+                        del fake.authorizations[name]
+                if auth is None:
+                    return self._send_error(404, f"{name} not found")
+                return self._send_json(200, {} if method == "DELETE" else auth)
+
+            def _dispatch(self, method):
+                path = urlsplit(self.path).path
+                body = self._body() if method in ("POST", "PATCH") else {}
+                if method == "POST" and path.endswith(":streamAssist"):
+                    if not self._inject("streamAssist"):
+                        self._stream_assist(body)
+                    return
+                if method == "POST" and path.endswith(":answer"):
+                    if not self._inject("answer"):
+                        self._answer(body)
+                    return
+                for pattern, handler, kind in ((_AGENTS_PATH, self._agents, "agents"), (_AUTHORIZATIONS_PATH, self._authorizations, "authorizations")):
+                    match = pattern.match(path)
+                    if match:
+                        if not self._inject(f"{kind}.{method}"):
+                            handler(method, match, body)
+                        return
+                self._send_error(404, f"No fake handler for {method} {path}")
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        return Handler
+
+
+def _camel_case(value):
+    # AgentspaceManager sends some fields in snake_case, the API answers in camelCase
+    if isinstance(value, dict):
+        return {re.sub(r"_([a-z])", lambda m: m.group(1).upper(), k): _camel_case(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_camel_case(v) for v in value]
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the Discovery Engine API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--chunks", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--first-byte-delay", type=float, default=0.1)
+    parser.add_argument("--chunk-delay", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false", help="Never compress responses")
+    args = parser.parse_args()
+
+    fake = FakeDiscoveryEngine(
+        args.host, args.port, chunks=args.chunks, chunk_size=args.chunk_size, first_byte_delay=args.first_byte_delay,
+        chunk_delay=args.chunk_delay, jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status,
+        gzip=args.gzip,
+    )
+    print(f"Fake Discovery Engine listening on {fake.url}, set DISCOVERY_ENGINE_API_ENDPOINT={fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        fake._server.server_close()
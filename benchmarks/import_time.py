@@ -0,0 +1,82 @@
+"""
+Measures the import time of the agent modules with `python -X importtime`.
+
+Each module is imported in a fresh interpreter (as on an Agent Engine cold start) a few
+times and the median cumulative import time is compared against its budget:
+
+    python benchmarks/import_time.py [module ...]
+
+IMPORT_TIME_RUNS sets the number of runs per module and IMPORT_TIME_BUDGET_MS overrides every
+budget; the script exits with status 1 when a module goes over its budget. Modules without a
+budget are only reported.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["RAG_app.agent", "no_llm.agent"]
+RUNS = int(os.getenv("IMPORT_TIME_RUNS", 5))
+# Both agents defer google.adk, google.genai, google.auth, requests and httpx to first use and
+# measure about 10 ms and 28 ms; the budgets leave room for a slower host, not for a heavy import
+BUDGETS_MS = {"RAG_app.agent": 15, "no_llm.agent": 40}
+BUDGET_MS = float(os.environ["IMPORT_TIME_BUDGET_MS"]) if os.getenv("IMPORT_TIME_BUDGET_MS") else None
+
+# "import time: <self us> | <cumulative us> | <indented module name>"
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def import_profile(module):
+    """
+    Imports `module` in a fresh interpreter.
+
+    Returns:
+        A dict of every module imported along the way to its cumulative import time in ms.
+    """
+    # MODEL keeps RAG_app.agent from reading a local .env, as on Agent Engine
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", MODEL=os.getenv("MODEL", "gemini-2.5-flash"))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            profile[match.group(4)] = int(match.group(2)) / 1000
+    return profile
+
+
+def measure(module, runs=RUNS):
+    """
+    Returns the median cumulative import time of `module` in ms, and the slowest
+    top-level imports it pulled in during the last run.
+    """
+    totals = []
+    for _ in range(runs):
+        profile = import_profile(module)
+        totals.append(profile[module])
+    heaviest = sorted(((ms, name) for name, ms in profile.items() if "." not in name and not module.startswith(name)), reverse=True)[:5]
+    return statistics.median(totals), heaviest
+
+
+def main(modules):
+    over_budget = False
+    for module in modules:
+        median_ms, heaviest = measure(module)
+        budget_ms = BUDGET_MS if BUDGET_MS is not None else BUDGETS_MS.get(module)
+        if budget_ms is None:
+            print(f"{module}: {median_ms:.1f} ms median over {RUNS} runs (no budget)")
+        else:
+            status = "OK" if median_ms <= budget_ms else "OVER BUDGET"
+            over_budget |= median_ms > budget_ms
+            print(f"{module}: {median_ms:.1f} ms median over {RUNS} runs (budget {budget_ms:.0f} ms) {status}")
+        for ms, name in heaviest:
+            print(f"    {name}: {ms:.1f} ms")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or MODULES))
@@ -0,0 +1,42 @@
+"""
+Correctness checks of AgentspaceManager's retry backoff.
+"""
+import email.utils
+import time
+
+import pytest
+
+from agentspace_manager import AgentspaceManager
+
+
+class StaticCredentials:
+    def get_token(self):
+        return "test-token"
+
+
+@pytest.fixture
+def client():
+    with AgentspaceManager(project_id="123", app_id="test-app", credentials=StaticCredentials(), api_endpoint="http://127.0.0.1:9",
+                           backoff_base=1.0, backoff_max=10.0) as client:
+        yield client
+
+
+@pytest.mark.parametrize("retry_after, expected", [("3", 3.0), ("2.5", 2.5), ("120", 10.0), ("-5", 0.0), ("0", 0.0)])
+def test_backoff_delay_honors_retry_after_seconds(client, retry_after, expected):
+    assert client._backoff_delay(0, retry_after) == expected
+
+
+def test_backoff_delay_honors_retry_after_http_date(client):
+    retry_after = email.utils.formatdate(time.time() + 5, usegmt=True)
+    assert 3.0 <= client._backoff_delay(0, retry_after) <= 5.0
+    assert client._backoff_delay(0, email.utils.formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert client._backoff_delay(0, email.utils.formatdate(time.time() + 3600, usegmt=True)) == 10.0
+
+
+@pytest.mark.parametrize("retry_after", [None, "", "soon", "nan", "inf", "-inf"])
+@pytest.mark.parametrize("attempt, cap", [(0, 1.0), (2, 4.0), (10, 10.0)])
+def test_backoff_delay_falls_back_to_capped_jitter(client, retry_after, attempt, cap):
+    delays = [client._backoff_delay(attempt, retry_after) for _ in range(200)]
+    assert all(0.0 <= delay <= cap for delay in delays)
+    # Full jitter spreads the retries over the whole window
+    assert max(delays) > cap / 2
@@ -0,0 +1,198 @@
+"""
+Correctness checks of the shared datastore service against the fake Discovery Engine.
+"""
+import concurrent.futures
+import threading
+import time
+import types
+import uuid
+
+import pytest
+
+import datastore_service
+import RAG_app.agent as agent
+from datastore_service import AdaptiveConcurrencyLimiter, CircuitBreaker, DatastoreUnavailableError, SemanticAnswerCache
+from discovery_common import DISCOVERY_SESSION_STATE_KEY, AnswerCache, UserTokenCache
+from fake_discovery_engine import FakeDiscoveryEngine
+
+
+@pytest.fixture
+def slow_fake(monkeypatch):
+    # A slow first byte keeps the first call in flight while the others arrive, so they coalesce
+    with FakeDiscoveryEngine(chunks=2, first_byte_delay=0.3) as fake:
+        monkeypatch.setattr(datastore_service, "DISCOVERY_ENGINE_API_ENDPOINT", fake.url)
+        monkeypatch.setattr(datastore_service, "DISCOVERY_SESSION_AFFINITY", True)
+        monkeypatch.setattr(agent, "DISCOVERY_SESSION_AFFINITY", True)
+        # The tokens are fake, there is nothing to ask Google about
+        monkeypatch.setattr(datastore_service.USER_TOKENS, "introspect", lambda token: None)
+        yield fake
+
+
+@pytest.fixture
+def user_tokens(monkeypatch):
+    tokens = UserTokenCache(refresh_margin=0.0)
+    monkeypatch.setattr(datastore_service, "USER_TOKENS", tokens)
+    monkeypatch.setattr(datastore_service.SERVICE_ACCOUNT_TOKENS, "get_token", lambda: "service-account-token")
+    return tokens
+
+
+def tool_context(user_id):
+    # Just what search_tasks reads from ADK's ToolContext; both users share the token, so their
+    # identical first turns have the same cache key
+    return types.SimpleNamespace(
+        user_id=user_id,
+        session=types.SimpleNamespace(id=f"adk-{user_id}-{uuid.uuid4().hex}"),
+        state={f"temp:{agent.AUTH_NAME}": "test-token"},
+    )
+
+
+def test_concurrent_first_turns_get_distinct_sessions(slow_fake):
+    contexts = [tool_context("alice"), tool_context("bob")]
+    query = f"first turn {uuid.uuid4().hex}"
+    shared = datastore_service.SEARCH_FLIGHTS.shared
+    barrier = threading.Barrier(len(contexts))
+
+    def first_turn(context):
+        barrier.wait()
+        return agent.search_tasks(query, context)
+
+    with concurrent.futures.ThreadPoolExecutor(len(contexts)) as pool:
+        answers = list(pool.map(first_turn, contexts))
+    assert all(answer["answer"] for answer in answers)
+    assert datastore_service.SEARCH_FLIGHTS.shared > shared, "the first turns did not coalesce"
+
+    # Only the caller that ran the call keeps the session it started
+    first_sessions = [context.state.get(DISCOVERY_SESSION_STATE_KEY) for context in contexts]
+    assert len([session for session in first_sessions if session]) == 1
+
+    for context in contexts:
+        agent.search_tasks(f"second turn {uuid.uuid4().hex}", context)
+    sessions = [datastore_service.DISCOVERY_SESSIONS.get(context.session.id, context.state[DISCOVERY_SESSION_STATE_KEY]) for context in contexts]
+    assert all(sessions)
+    assert sessions[0] != sessions[1]
+    assert all(slow_fake.sessions[session] >= 1 for session in sessions)
+
+
+def test_expired_user_token_falls_back_to_service_account(user_tokens):
+    service = datastore_service.DatastoreService()
+    user_tokens.put("alice", "user-token", expires_in=0.05)
+    assert service.resolve_access_token(None, "alice") == "user-token"
+    time.sleep(0.1)
+    assert service.resolve_access_token(None, "alice") == "service-account-token"
+
+
+@pytest.mark.parametrize("expires_in, expected", [(3600.0, "user-token"), (0.0, "service-account-token"), (None, "service-account-token")])
+def test_user_token_is_introspected_off_the_request_path(monkeypatch, user_tokens, expires_in, expected):
+    introspected = threading.Event()
+
+    def introspect(token):
+        introspected.wait(5)
+        return expires_in
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    user_tokens = UserTokenCache(refresh_margin=0.0, introspect=introspect, executor=executor)
+    monkeypatch.setattr(datastore_service, "USER_TOKENS", user_tokens)
+    service = datastore_service.DatastoreService()
+    user_tokens.put("alice", "user-token")
+    # Until its expiry is known the token is not reused, and nobody waits for the introspection
+    assert service.resolve_access_token(None, "alice") == "service-account-token"
+    introspected.set()
+    executor.shutdown(wait=True)
+    # A token tokeninfo rejects (0) or cannot vouch for (None) is dropped
+    assert service.resolve_access_token(None, "alice") == expected
+
+
+def test_revoked_user_token_falls_back_to_service_account(monkeypatch, user_tokens):
+    with FakeDiscoveryEngine(error_rate=1.0, error_status=401) as fake:
+        monkeypatch.setattr(datastore_service, "DISCOVERY_ENGINE_API_ENDPOINT", fake.url)
+        service = datastore_service.DatastoreService()
+        user_tokens.put("alice", "revoked-token", expires_in=3600)
+        access_token = service.resolve_access_token(None, "alice")
+        assert access_token == "revoked-token"
+        assert not service.search_streamAssist("test-project", "global", "test-datastore", f"query {uuid.uuid4().hex}", access_token).text
+    assert service.resolve_access_token(None, "alice") == "service-account-token"
+
+
+def test_circuit_breaker_transitions():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == "open"
+    with pytest.raises(DatastoreUnavailableError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    # A single probe goes through once the reset timeout passed, its failure opens the circuit again
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(DatastoreUnavailableError):
+        breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.on_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_circuit_breaker_abandoned_probe_lets_the_next_one_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.0)
+    breaker.on_failure()
+    breaker.before_call()
+    breaker.on_abandon()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+
+def test_adaptive_concurrency_limiter_transitions():
+    limiter = AdaptiveConcurrencyLimiter("test", latency_target=1.0, initial=2, min_limit=1, max_limit=3)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(DatastoreUnavailableError):
+        limiter.acquire()
+    assert limiter.rejected == 1
+
+    # Additive increase for a fast success, multiplicative decrease for a slow one or a failure
+    limiter.release(ok=True, latency=0.5)
+    assert limiter.limit == 2.5
+    limiter.release(ok=True, latency=2.0)
+    assert limiter.limit == 1.25
+    limiter.acquire()
+    limiter.release(ok=False)
+    assert limiter.limit == 1
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 1 and limiter.in_flight == 0
+
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(ok=True, latency=0.0)
+    assert limiter.limit == 3
+
+
+def similarity(first, second):
+    first, second = (SemanticAnswerCache.shingles(AnswerCache.normalize_query(query)) for query in (first, second))
+    return len(first & second) / len(first | second)
+
+
+@pytest.mark.parametrize("offset, hit", [(0.0, True), (0.01, False)])
+def test_semantic_cache_threshold(offset, hit):
+    stored, asked = "Qual a missão da TBG?", "qual é a missao da TBG"
+    cache = SemanticAnswerCache(threshold=similarity(stored, asked) + offset)
+    cache.put("streamAssist", stored, "app", "token", "answer")
+    assert cache.get("streamAssist", asked, "app", "token") == ("answer" if hit else None)
+
+
+def test_semantic_cache_requires_the_same_identifiers_and_scope():
+    cache = SemanticAnswerCache(threshold=0.5)
+    cache.put("streamAssist", "status of task 12", "app", "token", "answer")
+    assert cache.get("streamAssist", "status of task 12", "app", "token") == "answer"
+    assert cache.get("streamAssist", "status of task 13", "app", "token") is None
+    assert cache.get("streamAssist", "status of task 12", "other-app", "token") is None
+    assert cache.get("answer", "status of task 12", "app", "token") is None
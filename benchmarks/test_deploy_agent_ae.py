@@ -0,0 +1,50 @@
+"""
+Correctness checks of the deploy manifests compared by deploy_agent_ae to skip no-op deploys.
+"""
+import importlib
+
+import pytest
+
+pytest.importorskip("vertexai")
+
+
+@pytest.fixture
+def deploy(monkeypatch):
+    # The deploy script reads its required settings at import time
+    monkeypatch.setenv("STAGING_BUCKET", "gs://test-bucket")
+    monkeypatch.setenv("GOOGLE_CLOUD_PROJECT_NUMBER", "123")
+    return importlib.import_module("deploy_agent_ae")
+
+
+def manifest(files=None, env=None, config=None):
+    return {
+        "files": files if files is not None else {"agent.py": "a", "requirements.txt": "r"},
+        "env": env if env is not None else {"MODEL": "m"},
+        "config": config if config is not None else {"location": "us-central1"},
+        "hash": "ignored",
+    }
+
+
+def test_diff_manifests_without_a_previous_deploy(deploy):
+    assert deploy.diff_manifests(None, manifest()) == ["no previous deploy manifest"]
+    assert deploy.diff_manifests({}, manifest()) == ["no previous deploy manifest"]
+
+
+def test_diff_manifests_identical(deploy):
+    assert deploy.diff_manifests(manifest(), manifest()) == []
+
+
+def test_diff_manifests_lists_every_change(deploy):
+    old = manifest()
+    new = manifest(
+        files={"agent.py": "b", "datastore_service.py": "d"},
+        env={"MODEL": "m", "AGENT_WARMUP": "w"},
+        config={"location": "europe-west1"},
+    )
+    assert deploy.diff_manifests(old, new) == [
+        "files.agent.py changed",
+        "files.datastore_service.py added",
+        "files.requirements.txt removed",
+        "env.AGENT_WARMUP added",
+        "config.location changed",
+    ]
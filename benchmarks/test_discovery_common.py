@@ -0,0 +1,81 @@
+"""
+Correctness checks of the discovery_common building blocks.
+"""
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from discovery_common import JsonArrayParser, SingleFlight
+
+ELEMENTS = [
+    {"answer": {"replies": [{"text": "brackets ] } [ { inside a string"}]}},
+    {"text": "escaped \" quote and backslash \\", "nested": [[1, 2], {"a": []}]},
+    {"text": "missão – 日本語 🚀"},
+    [],
+    "a bare string",
+    42,
+]
+BODY = json.dumps(ELEMENTS, ensure_ascii=False).encode()
+
+
+def parse(chunks):
+    parser = JsonArrayParser()
+    return [element for chunk in chunks for element in parser.feed(chunk)]
+
+
+def test_json_array_parser_whole_body():
+    # Response elements are objects; the parser only yields containers, scalars are skipped
+    assert parse([BODY]) == [element for element in ELEMENTS if isinstance(element, (dict, list))]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_json_array_parser_split_chunks(seed):
+    # Splits land inside strings, escapes and multi-byte UTF-8 characters
+    generator = random.Random(seed)
+    cuts = sorted(generator.sample(range(1, len(BODY)), 20))
+    chunks = [BODY[start:end] for start, end in zip([0] + cuts, cuts + [len(BODY)])]
+    assert parse(chunks) == parse([BODY])
+
+
+def test_json_array_parser_one_byte_at_a_time():
+    assert parse([BODY[i:i + 1] for i in range(len(BODY))]) == parse([BODY])
+
+
+def test_single_flight_shares_the_leader_error():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    errors = []
+
+    def call():
+        try:
+            flights.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    # The follower is waiting on the leader's call once it was counted as shared
+    while not flights.shared:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert len(errors) == 2 and errors[0] is errors[1]
+    # A failed call is not remembered, the next caller runs it again
+    assert flights.do("key", lambda: "ok") == "ok"
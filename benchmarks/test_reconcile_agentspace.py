@@ -0,0 +1,85 @@
+"""
+Correctness checks of the reconcile plan against the fake agents and authorizations CRUD.
+"""
+import asyncio
+import contextlib
+import io
+
+from agentspace_manager import AsyncAgentspaceManager
+from fake_discovery_engine import FakeDiscoveryEngine
+from reconcile_agentspace import desired_agent, desired_authorization, plan
+
+
+class StaticCredentials:
+    def get_token(self):
+        return "test-token"
+
+
+def authorization(auth_id):
+    return {"id": auth_id, "client_id": f"{auth_id}-client", "client_secret": "secret",
+            "scopes": ["https://www.googleapis.com/auth/cloud-platform"]}
+
+
+def agent(display_name, reasoning_engine_id=1000, description="Answers questions"):
+    return {"display_name": display_name, "description": description, "tool_description": "Answers questions",
+            "reasoning_engine_id": reasoning_engine_id, "reasoning_engine_location": "us-central1", "auth_ids": ["kept-auth"]}
+
+
+SPEC = {
+    "project_number": "123",
+    "prune_authorizations": True,
+    "authorizations": [authorization("kept-auth"), authorization("new-auth")],
+    "apps": [
+        {"app_id": "pruned-app", "prune": True,
+         "agents": [agent("kept"), agent("new"), agent("moved", reasoning_engine_id=2000), agent("described", description="New description")]},
+        {"app_id": "other-app", "agents": [agent("kept")]},
+    ],
+}
+
+
+async def seed(client):
+    app_clients = {app["app_id"]: client.for_app(app["app_id"]) for app in SPEC["apps"]}
+    await client.create_authorization(**desired_authorization(client, authorization("kept-auth")))
+    await client.create_authorization(**desired_authorization(client, authorization("stale-auth")))
+    registered = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for app_id, spec in (("pruned-app", agent("kept")), ("pruned-app", agent("kept")), ("pruned-app", agent("moved")),
+                             ("pruned-app", agent("described")), ("pruned-app", agent("extra")),
+                             ("other-app", agent("kept")), ("other-app", agent("unlisted"))):
+            created = await app_clients[app_id].register_agent(**desired_agent(spec))
+            registered.setdefault((app_id, spec["display_name"]), []).append(created["name"])
+    return registered
+
+
+async def apply(phases):
+    for phase in phases:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(call() for _, call in phase))
+
+
+def test_reconcile_plan_and_convergence():
+    async def run():
+        with FakeDiscoveryEngine() as fake:
+            async with AsyncAgentspaceManager(project_id="123", app_id=None, credentials=StaticCredentials(), api_endpoint=fake.url,
+                                              backoff_base=0.001, backoff_max=0.01) as client:
+                registered = await seed(client)
+                phases = await plan(client, SPEC)
+                descriptions = [[description for description, _ in phase] for phase in phases]
+                await apply(phases)
+                return registered, descriptions, await plan(client, SPEC)
+
+    registered, (auth_actions, agent_actions, auth_deletes), replanned = asyncio.run(run())
+
+    assert auth_actions == ["create authorization new-auth"]
+    assert auth_deletes == ["delete authorization stale-auth"]
+    duplicate = registered["pruned-app", "kept"][1]
+    extra = registered["pruned-app", "extra"][0]
+    assert sorted(agent_actions) == sorted([
+        "[pruned-app] register agent new",
+        "[pruned-app] update agent moved (reasoning_engine)",
+        "[pruned-app] update agent described (description)",
+        f"[pruned-app] delete agent kept ({duplicate})",
+        f"[pruned-app] delete agent extra ({extra})",
+    ])
+    # other-app is not pruned, so its unlisted agent stays; applying the plan leaves nothing to do
+    assert replanned == ([], [], [])
@@ -0,0 +1,764 @@
+"""
+The Discovery Engine datastore service shared by the agents (RAG_app, no_llm): its
+configuration from the environment, the process-wide token, session and answer caches,
+the per-endpoint guards and telemetry, and DatastoreService with its retrieval strategies
+and warm-up. Each agent keeps only what differs: RAG_app's search_tasks tool and no_llm's
+async streaming path.
+
+deploy_agent_ae.py ships this module next to the agent package, like discovery_common.
+google.auth and requests are imported on first use, so importing it stays cheap.
+"""
+import os
+import re
+import math
+import contextlib
+import contextvars
+import hashlib
+import random
+import time
+import threading
+import collections
+import concurrent.futures
+import logging
+
+from discovery_common import (
+    JSON_CODEC, AnswerCache, DiscoverySessionMap, JsonArrayParser, LatencyStats, ServiceAccountTokenCache, SingleFlight,
+    StreamAssistExtractor, StreamAssistResult, StructuredLog, Telemetry, UserTokenCache, discovery_engine_endpoint,
+    new_discovery_session, transport_headers,
+)
+
+# Agent Engine and the deploy script provide the configuration; only a bare local import reads .env
+if "MODEL" not in os.environ:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Logging is configured by the host (Agent Engine, adk web, the deploy script)
+logger = logging.getLogger(__name__)
+
+PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
+LOCATION = os.getenv("DATASTORE_LOCATION")
+DATA_STORE_ID = os.getenv("DATASTORE_ID")
+AUTH_NAME = os.getenv("AGENT_AUTH_OBJECT_ID")
+AGENTSPACE_APP_ID = os.getenv("AGENTSPACE_APP_ID_SEARCH")
+# Scheme and host replacing the regional Discovery Engine endpoint, e.g. a local stand-in for benchmarks
+DISCOVERY_ENGINE_API_ENDPOINT = os.getenv("DISCOVERY_ENGINE_API_ENDPOINT")
+# Ask for gzip-compressed responses; JSON_CODEC picks the codec, see discovery_common.JsonCodec
+DISCOVERY_ENGINE_GZIP = os.getenv("DISCOVERY_ENGINE_GZIP", "1").lower() in ("1", "true", "yes")
+# Opt-in warm-up before the replica serves, see warm_up
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "").lower() in ("1", "true", "yes")
+AGENT_WARMUP_PROBE = os.getenv("AGENT_WARMUP_PROBE")
+# "primary", "hedged" or "race", see DatastoreService.retrieve; RAG_app's search_tasks is its only caller
+RETRIEVAL_STRATEGY = os.getenv("RETRIEVAL_STRATEGY", "primary")
+RETRIEVAL_PRIMARY = os.getenv("RETRIEVAL_PRIMARY", "streamAssist")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "3.0"))
+# Follow-up turns continue the Discovery Engine assistant session of their ADK session, see DiscoverySessionMap
+DISCOVERY_SESSION_AFFINITY = os.getenv("DISCOVERY_SESSION_AFFINITY", "1").lower() in ("1", "true", "yes")
+DISCOVERY_SESSION_TTL = float(os.getenv("DISCOVERY_SESSION_TTL", "1800"))
+# Datastore call records: sampled fraction, per-field size cap, "json" or "text", queued off the request thread
+AGENT_LOG_SAMPLE_RATE = float(os.getenv("AGENT_LOG_SAMPLE_RATE", "1.0"))
+AGENT_LOG_MAX_CHARS = int(os.getenv("AGENT_LOG_MAX_CHARS", "1000"))
+AGENT_LOG_FORMAT = os.getenv("AGENT_LOG_FORMAT", "json")
+AGENT_LOG_QUEUE = os.getenv("AGENT_LOG_QUEUE", "1").lower() in ("1", "true", "yes")
+DATASTORE_CONNECT_TIMEOUT = float(os.getenv("DATASTORE_CONNECT_TIMEOUT", "5"))
+ANSWER_TIMEOUT = float(os.getenv("ANSWER_TIMEOUT", "30"))
+STREAM_ASSIST_TIMEOUT = float(os.getenv("STREAM_ASSIST_TIMEOUT", "60"))
+# Calls slower than this (seconds) shrink the concurrency limit; empty derives it per endpoint, see EndpointGuard
+DATASTORE_LATENCY_TARGET = float(os.getenv("DATASTORE_LATENCY_TARGET") or 0) or None
+
+_WORD = re.compile(r"\w+")
+
+class SemanticAnswerCache:
+    """
+    Size-bounded LRU cache with TTL answering near-duplicate queries, e.g. "Qual a missão
+    da TBG?" and "qual é a missao da TBG", without any model or external service.
+
+    Queries are normalized like AnswerCache keys and compared by the Jaccard similarity of
+    their character trigrams. A MinHash LSH index finds the candidate entries in constant
+    time; a candidate is served when its exact similarity reaches `threshold` and both
+    queries name the same identifiers (numbers and acronyms), so "task 12" never answers
+    "task 13". Entries are scoped like AnswerCache keys: endpoint, datastore/app ID and identity.
+    """
+
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600.0, threshold: float = 0.8,
+                 num_perm: int = 64, bands: int = 16):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        generator = random.Random(0)
+        self._permutations = [(generator.randrange(1, self._PRIME), generator.randrange(self._PRIME)) for _ in range(bands * self.rows)]
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._buckets = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def shingles(normalized: str) -> frozenset:
+        padded = f" {normalized} "
+        return frozenset(padded[i:i + 3] for i in range(max(1, len(padded) - 2)))
+
+    @staticmethod
+    def identifiers(query: str) -> frozenset:
+        # Numbers and acronyms pin a question to one entity; they must match exactly
+        return frozenset(
+            AnswerCache.normalize_query(token) for token in _WORD.findall(query)
+            if any(c.isdigit() for c in token) or (len(token) > 1 and token.isupper())
+        )
+
+    def _band_keys(self, scope: tuple, shingles: frozenset) -> list:
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big") for shingle in shingles]
+        signature = [min((a * h + b) % self._PRIME for h in hashes) for a, b in self._permutations]
+        return [(scope, band, tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band_key in entry["bands"]:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def get(self, endpoint: str, query: str, resource_id: str, access_token: str):
+        """
+        Returns the value cached for the most similar query above the threshold in the
+        same scope, or None when there is none.
+        """
+        if self.max_size <= 0:
+            return None
+        scope = (endpoint, resource_id, AnswerCache.identity_scope(access_token))
+        normalized = AnswerCache.normalize_query(query)
+        shingles = self.shingles(normalized)
+        identifiers = self.identifiers(query)
+        tokens = set(normalized.split())
+        band_keys = self._band_keys(scope, shingles)
+        now = time.monotonic()
+        with self._lock:
+            candidates = set().union(*(self._buckets.get(band_key, ()) for band_key in band_keys))
+            best, best_similarity = None, self.threshold
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry["stored_at"] > self.ttl:
+                    self._remove(key)
+                    self.expirations += 1
+                    continue
+                if not (identifiers <= entry["tokens"] and entry["identifiers"] <= tokens):
+                    continue
+                similarity = len(shingles & entry["shingles"]) / len(shingles | entry["shingles"])
+                if similarity >= best_similarity:
+                    best, best_similarity = key, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best]["value"]
+
+    def put(self, endpoint: str, query: str, resource_id: str, access_token: str, value):
+        if self.max_size <= 0:
+            return
+        scope = (endpoint, resource_id, AnswerCache.identity_scope(access_token))
+        normalized = AnswerCache.normalize_query(query)
+        key = scope + (normalized,)
+        shingles = self.shingles(normalized)
+        band_keys = self._band_keys(scope, shingles)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "value": value,
+                "stored_at": time.monotonic(),
+                "shingles": shingles,
+                "tokens": frozenset(normalized.split()),
+                "identifiers": self.identifiers(query),
+                "bands": band_keys,
+            }
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "buckets": len(self._buckets),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class DatastoreUnavailableError(RuntimeError):
+    """
+    Raised without calling Discovery Engine when an endpoint's circuit is open or its
+    concurrency limit is exhausted.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single half-open probe through: its success
+    closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise DatastoreUnavailableError(f"{self.name} circuit is open")
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    raise DatastoreUnavailableError(f"{self.name} circuit is half-open, waiting for the probe")
+                self._probing = True
+
+    def on_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"{self.name} circuit opened after {self._failures} failure(s)")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def on_abandon(self):
+        with self._lock:
+            self._probing = False
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit: each successful call within `latency_target` raises the limit
+    by 1/limit (about +1 per round of calls), each failure or slow call halves it. Calls
+    over the limit are shed immediately instead of queueing.
+    """
+
+    def __init__(self, name: str, latency_target: float, initial: int = 8, min_limit: int = 1, max_limit: int = 64):
+        self.name = name
+        self.latency_target = latency_target
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight >= math.floor(self.limit):
+                self.rejected += 1
+                raise DatastoreUnavailableError(f"{self.name} is overloaded ({self.in_flight} calls in flight, limit {math.floor(self.limit)})")
+            self.in_flight += 1
+
+    def release(self, ok: bool = None, latency: float = 0.0):
+        """
+        Releases a slot. `ok` None releases it without adjusting the limit.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if ok is None:
+                return
+            if ok and latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit / 2)
+
+
+class EndpointGuard:
+    """
+    Per-endpoint resilience: (connect, read) timeouts, a total deadline, a circuit breaker
+    and an adaptive concurrency limit.
+
+    The limiter's latency target is DATASTORE_LATENCY_TARGET when set, otherwise twice the
+    p95 of the endpoint's successful calls, kept between MIN_LATENCY_TARGET (sub-second
+    jitter is not overload) and half the deadline, which is also the target until enough
+    calls were observed.
+    """
+
+    MIN_LATENCY_TARGET = 1.0
+
+    class _Call:
+        __slots__ = ("failed",)
+
+        def __init__(self):
+            self.failed = False
+
+    def __init__(self, name: str, total_timeout: float):
+        self.name = name
+        self.total_timeout = total_timeout
+        self.timeout = (DATASTORE_CONNECT_TIMEOUT, total_timeout)
+        self.breaker = CircuitBreaker(name)
+        self.latency = LatencyStats()
+        self.limiter = AdaptiveConcurrencyLimiter(name, latency_target=DATASTORE_LATENCY_TARGET or total_timeout / 2)
+
+    def latency_target(self) -> float:
+        if DATASTORE_LATENCY_TARGET:
+            return DATASTORE_LATENCY_TARGET
+        p95 = self.latency.percentile(95)
+        if p95 is None:
+            return self.total_timeout / 2
+        return min(max(2 * p95, self.MIN_LATENCY_TARGET), self.total_timeout / 2)
+
+    @contextlib.contextmanager
+    def call(self):
+        """
+        Guards one upstream call. Exceptions count as failures; set `failed` on the yielded
+        object for error responses that do not raise (e.g. HTTP 5xx/429).
+        """
+        self.limiter.acquire()
+        try:
+            self.breaker.before_call()
+        except DatastoreUnavailableError:
+            self.limiter.release()
+            raise
+        call = self._Call()
+        started = time.perf_counter()
+        try:
+            yield call
+        except GeneratorExit:
+            # The consumer stopped reading a stream: no signal about the endpoint's health.
+            self.breaker.on_abandon()
+            self.limiter.release()
+            raise
+        except Exception:
+            self.breaker.on_failure()
+            self.limiter.release(False)
+            raise
+        if call.failed:
+            self.breaker.on_failure()
+            self.limiter.release(False)
+        else:
+            self.breaker.on_success()
+            latency = time.perf_counter() - started
+            self.latency.record(latency)
+            self.limiter.latency_target = self.latency_target()
+            self.limiter.release(True, latency)
+
+    def check_deadline(self, started: float):
+        if time.perf_counter() - started > self.total_timeout:
+            import requests
+            raise requests.exceptions.Timeout(f"{self.name} exceeded its {self.total_timeout}s deadline")
+
+
+SERVICE_ACCOUNT_TOKENS = ServiceAccountTokenCache()
+USER_TOKENS = UserTokenCache()
+DISCOVERY_SESSIONS = DiscoverySessionMap(
+    max_size=int(os.getenv("DISCOVERY_SESSION_CACHE_SIZE", "1024")),
+    ttl=DISCOVERY_SESSION_TTL,
+)
+ANSWER_CACHE = AnswerCache(
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "600")),
+)
+# Near-duplicate queries share the exact cache's TTL; SEMANTIC_CACHE_SIZE=0 disables matching
+SEMANTIC_CACHE = SemanticAnswerCache(
+    max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "600")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8")),
+)
+SEARCH_FLIGHTS = SingleFlight()
+TELEMETRY = Telemetry(__name__)
+LOG = StructuredLog(logger, AGENT_LOG_SAMPLE_RATE, AGENT_LOG_MAX_CHARS, AGENT_LOG_FORMAT == "json", AGENT_LOG_QUEUE)
+BACKEND_LATENCY = {"streamAssist": LatencyStats(), "answer": LatencyStats()}
+_HEDGE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="datastore-retrieval")
+ENDPOINT_GUARDS = {"answer": EndpointGuard("answer", ANSWER_TIMEOUT), "streamAssist": EndpointGuard("streamAssist", STREAM_ASSIST_TIMEOUT)}
+
+
+def cached_answer(endpoint: str, query: str, resource_id: str, access_token: str):
+    """
+    Returns the answer cached for `query`, or for a near-duplicate of it, or None.
+    """
+    cached = ANSWER_CACHE.get(ANSWER_CACHE.key(endpoint, query, resource_id, access_token))
+    if cached is None:
+        cached = SEMANTIC_CACHE.get(endpoint, query, resource_id, access_token)
+    return cached
+
+
+def cache_answer(endpoint: str, query: str, resource_id: str, access_token: str, answer):
+    ANSWER_CACHE.put(ANSWER_CACHE.key(endpoint, query, resource_id, access_token), answer)
+    SEMANTIC_CACHE.put(endpoint, query, resource_id, access_token, answer)
+
+
+class DatastoreService:
+    """
+    Client for the Discovery Engine :answer and :streamAssist endpoints.
+
+    Use `get_datastore_service()` for the process-wide instance, which keeps a pooled
+    keep-alive session and reuses the cached service account and per-user tokens.
+    Passing `access_token` pins every call of the instance to that token.
+    """
+
+    def __init__(self, access_token: str = None, pool_size: int = 20):
+        import requests
+        import requests.adapters
+        self.access_token = access_token or None
+        self.session = requests.Session()
+        self.session.headers.update(transport_headers(DISCOVERY_ENGINE_GZIP))
+        self.session.mount("https://", TELEMETRY.https_adapter(pool_size))
+        # Plain HTTP only serves a local DISCOVERY_ENGINE_API_ENDPOINT stand-in
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+
+    def resolve_access_token(self, access_token: str = None, user_id: str = None) -> str:
+        """
+        Returns the token to call Discovery Engine with: the user's OAuth token when one is
+        given (it is remembered for `user_id`) or still cached for `user_id`, otherwise the
+        pinned token or the cached service account token.
+        """
+        if access_token:
+            if user_id:
+                USER_TOKENS.put(user_id, access_token)
+            return access_token
+        if user_id:
+            cached = USER_TOKENS.get(user_id)
+            if cached:
+                return cached
+        if self.access_token:
+            return self.access_token
+        with TELEMETRY.span("datastore.token"):
+            started = time.perf_counter()
+            token = SERVICE_ACCOUNT_TOKENS.get_token()
+            TELEMETRY.record("token", time.perf_counter() - started, source="service_account")
+        return token
+
+    def search_datastore(self, project_id, location, datastore_id, query, access_token: str = None):
+        access_token = access_token or self.resolve_access_token()
+        cached = cached_answer("answer", query, DATA_STORE_ID, access_token)
+        if cached is not None:
+            return cached
+        cache_key = ANSWER_CACHE.key("answer", query, DATA_STORE_ID, access_token)
+        return SEARCH_FLIGHTS.do(cache_key, lambda: self._fetch_answer(project_id, location, query, access_token))
+
+    def answer_url(self, project_id, location):
+        return f"{discovery_engine_endpoint(location, DISCOVERY_ENGINE_API_ENDPOINT)}/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{DATA_STORE_ID}/servingConfigs/default_search:answer"
+
+    def _fetch_answer(self, project_id, location, query, access_token):
+        # Define API endpoint and headers
+        url = self.answer_url(project_id, location)
+
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+
+        # Define request data with placeholders for query
+        data = {
+            "query": {"text":f"{query}"},
+            "searchSpec": {
+                "searchParams": {
+                    "maxReturnResults": 5
+                }
+                }
+            }
+
+        # Make POST request
+        guard = ENDPOINT_GUARDS["answer"]
+        with TELEMETRY.span("datastore.answer", backend="answer"):
+            started = time.perf_counter()
+            with guard.call() as call:
+                response = self.session.post(url, headers=headers, data=JSON_CODEC.dumps(data), timeout=guard.timeout)
+                call.failed = response.status_code == 429 or response.status_code >= 500
+            self._record_response("answer", response, started)
+        
+            LOG("datastore.answer", status=response.status_code, response_bytes=len(response.content), body=response.content)
+            if response.status_code == 401:
+                USER_TOKENS.discard(access_token)
+        
+            try:
+                parse_started = time.perf_counter()
+                answer = JSON_CODEC.loads(response.content)['answer']['answerText']
+                TELEMETRY.record("parse", time.perf_counter() - parse_started, backend="answer")
+            except Exception as e:
+                logger.error("Could not read the :answer response (HTTP %s): %r", response.status_code, e)
+                return None
+        if answer:
+            cache_answer("answer", query, DATA_STORE_ID, access_token, answer)
+        return answer
+        
+
+    @staticmethod
+    def _record_response(backend, response, started, streamed=False):
+        # Time to the response headers and the request size; the body is measured here unless streamed
+        TELEMETRY.record("ttfb", response.elapsed.total_seconds(), backend=backend)
+        TELEMETRY.count_bytes("request", len(response.request.body or b""), backend=backend)
+        if not streamed:
+            TELEMETRY.record("upstream", time.perf_counter() - started, backend=backend)
+            TELEMETRY.count_bytes("response", len(response.content), backend=backend)
+
+    def stream_assist_url(self, project_id, location):
+        return f"{discovery_engine_endpoint(location, DISCOVERY_ENGINE_API_ENDPOINT)}/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/engines/{AGENTSPACE_APP_ID}/assistants/default_assistant:streamAssist"
+
+    def stream_streamAssist(self, project_id, location, datastore_id, query, extractor: StreamAssistExtractor = None, access_token: str = None,
+                            session: str = None):
+        """
+        Streams the answer of the assistant, yielding grounded-content text chunks as they arrive.
+
+        Pass an `extractor` to collect the full answer, references and timings while streaming,
+        and the `session` of an earlier answer to continue that conversation. Without one (or
+        when the API no longer knows it), a new session is started with DISCOVERY_SESSION_AFFINITY
+        and reported in `extractor.session`.
+        """
+        extractor = extractor or StreamAssistExtractor()
+        # Define API endpoint and headers
+        url = self.stream_assist_url(project_id, location)
+
+        access_token = access_token or self.resolve_access_token()
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+
+        # Define request data with placeholders for query
+        data = {
+            "query": {"text":f"{query}"},
+        #    "toolsSpec": {
+        #        "vertexAiSearchSpec": {
+        #            "dataStoreSpecs": [ { "dataStore": f"projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{datastore_id}" }]
+        #        }
+        #        }
+            }
+        if DISCOVERY_SESSION_AFFINITY:
+            data["session"] = session or new_discovery_session(project_id, location, AGENTSPACE_APP_ID)
+
+        # Make POST request, reading the JSON array incrementally as the assistant generates it
+        guard = ENDPOINT_GUARDS["streamAssist"]
+        started = time.perf_counter()
+        expired_session = False
+        with guard.call() as call, self.session.post(url, headers=headers, data=JSON_CODEC.dumps(data), stream=True, timeout=guard.timeout) as response:
+            self._record_response("streamAssist", response, started, streamed=True)
+            # A session the API no longer knows (expired or deleted) is replaced by a new one below
+            expired_session = bool(session) and response.status_code in (400, 404)
+            if not response.ok and not expired_session:
+                call.failed = response.status_code == 429 or response.status_code >= 500
+                if response.status_code == 401:
+                    USER_TOKENS.discard(access_token)
+                LOG("datastore.stream_error", level=logging.ERROR, sampled=False, status=response.status_code, body=response.content)
+                return
+            if response.ok:
+                parser = JsonArrayParser()
+                parse_time = 0.0
+                response_bytes = 0
+                for chunk in response.iter_content(chunk_size=None):
+                    parse_started = time.perf_counter()
+                    response_bytes += len(chunk)
+                    texts = [text for element in parser.feed(chunk) for text in extractor.feed(element)]
+                    parse_time += time.perf_counter() - parse_started
+                    yield from texts
+                    guard.check_deadline(started)
+                TELEMETRY.record_stream(extractor, started, parse_time, response_bytes)
+        if expired_session:
+            logger.warning(f"Discovery Engine session {session} was rejected, starting a new one")
+            yield from self.stream_streamAssist(project_id, location, datastore_id, query, extractor, access_token)
+
+    def search_streamAssist(self, project_id, location, datastore_id, query, access_token: str = None) -> StreamAssistResult:
+        access_token = access_token or self.resolve_access_token()
+        cached = cached_answer("streamAssist", query, AGENTSPACE_APP_ID, access_token)
+        if cached is not None:
+            return cached
+
+        cache_key = ANSWER_CACHE.key("streamAssist", query, AGENTSPACE_APP_ID, access_token)
+        # The Discovery Engine session started by the leader stays with the leader
+        result = SEARCH_FLIGHTS.do(cache_key, lambda: self._fetch_streamAssist(project_id, location, datastore_id, query, access_token),
+                                   StreamAssistResult.without_session)
+
+        LOG("datastore.streamAssist", answer=result.text, references=len(result.references), total_time=result.total_time)
+
+        return result
+
+    def _fetch_streamAssist(self, project_id, location, datastore_id, query, access_token, session: str = None) -> StreamAssistResult:
+        extractor = StreamAssistExtractor()
+        with TELEMETRY.span("datastore.streamAssist", backend="streamAssist"):
+            for _ in self.stream_streamAssist(project_id, location, datastore_id, query, extractor, access_token, session):
+                pass
+        result = extractor.result()
+        # A follow-up answer depends on its conversation, only first turns are shared
+        if result.text and not session:
+            cache_answer("streamAssist", query, AGENTSPACE_APP_ID, access_token, result.without_session())
+        return result
+
+    def backend_url(self, backend, project_id, location):
+        if backend == "answer":
+            return self.answer_url(project_id, location)
+        return self.stream_assist_url(project_id, location)
+
+    def _cached_result(self, backend, query, access_token) -> StreamAssistResult:
+        if backend == "answer":
+            text = cached_answer("answer", query, DATA_STORE_ID, access_token)
+            return StreamAssistResult(text, [], None, 0.0, backend="answer") if text is not None else None
+        return cached_answer("streamAssist", query, AGENTSPACE_APP_ID, access_token)
+
+    def _search_backend(self, backend, project_id, location, datastore_id, query, access_token, session: str = None) -> StreamAssistResult:
+        # Goes straight to the (coalesced) upstream call so the recorded latency is never a cache hit.
+        started = time.perf_counter()
+        if session:
+            result = self._fetch_streamAssist(project_id, location, datastore_id, query, access_token, session)
+        elif backend == "answer":
+            cache_key = ANSWER_CACHE.key("answer", query, DATA_STORE_ID, access_token)
+            text = SEARCH_FLIGHTS.do(cache_key, lambda: self._fetch_answer(project_id, location, query, access_token))
+            result = StreamAssistResult(text or "", [], None, time.perf_counter() - started, backend="answer")
+        else:
+            cache_key = ANSWER_CACHE.key("streamAssist", query, AGENTSPACE_APP_ID, access_token)
+            # Other first turns of the same query get the answer, not the leader's session; they
+            # start their own conversation on their next turn
+            result = SEARCH_FLIGHTS.do(cache_key, lambda: self._fetch_streamAssist(project_id, location, datastore_id, query, access_token),
+                                       StreamAssistResult.without_session)
+        if result.text:
+            BACKEND_LATENCY[backend].record(time.perf_counter() - started)
+        return result
+
+    def hedge_delay(self, backend) -> float:
+        """
+        Returns how long to wait for `backend` before hedging: its HEDGE_PERCENTILE latency,
+        or HEDGE_DEFAULT_DELAY until enough samples were recorded.
+        """
+        delay = BACKEND_LATENCY[backend].percentile(HEDGE_PERCENTILE)
+        return HEDGE_DEFAULT_DELAY if delay is None else delay
+
+    def retrieve(self, project_id, location, datastore_id, query, access_token: str = None, strategy: str = None,
+                 session: str = None) -> StreamAssistResult:
+        """
+        Retrieves an answer from the :streamAssist and/or :answer backends.
+
+        With the "primary" strategy only RETRIEVAL_PRIMARY is queried. With "hedged" the other
+        backend is also queried once the primary is slower than its hedge delay (or fails), and
+        with "race" both are queried at once. The first non-empty answer wins; the slower call
+        still completes in the background and fills the cache.
+
+        A follow-up turn passes the `session` of its previous answer: it goes to :streamAssist
+        in that session, bypassing the caches and the strategy.
+        """
+        access_token = access_token or self.resolve_access_token()
+        if session:
+            return self._search_backend("streamAssist", project_id, location, datastore_id, query, access_token, session)
+        strategy = strategy or RETRIEVAL_STRATEGY
+        primary = RETRIEVAL_PRIMARY
+        secondary = "answer" if primary == "streamAssist" else "streamAssist"
+        backends = (primary,) if strategy == "primary" else (primary, secondary)
+
+        for backend in backends:
+            cached = self._cached_result(backend, query, access_token)
+            if cached is not None:
+                return cached
+        if strategy == "primary":
+            return self._search_backend(primary, project_id, location, datastore_id, query, access_token)
+
+        def submit(backend):
+            # The copied context keeps the backend calls inside the caller's trace
+            return _HEDGE_EXECUTOR.submit(contextvars.copy_context().run, self._search_backend, backend, project_id, location, datastore_id, query, access_token)
+
+        def usable(future):
+            return future.exception() is None and bool(future.result().text)
+
+        futures = [submit(primary)]
+        if strategy == "race":
+            futures.append(submit(secondary))
+        else:
+            done, _ = concurrent.futures.wait(futures, timeout=self.hedge_delay(primary))
+            if done and usable(futures[0]):
+                return futures[0].result()
+            logger.info(f"Hedging {primary} with {secondary}")
+            futures.append(submit(secondary))
+
+        fallback, error = None, None
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if usable(future):
+                    return future.result()
+                if future.exception() is not None:
+                    error = future.exception()
+                else:
+                    fallback = fallback or future.result()
+        if fallback is not None:
+            return fallback
+        raise error
+
+
+_datastore_service = None
+_datastore_service_lock = threading.Lock()
+
+
+def get_datastore_service() -> DatastoreService:
+    """
+    Returns the process-wide DatastoreService, creating it on first use.
+    """
+    global _datastore_service
+    if _datastore_service is None:
+        with _datastore_service_lock:
+            if _datastore_service is None:
+                _datastore_service = DatastoreService()
+    return _datastore_service
+
+
+
+def run_warm_up(steps, force: bool = False) -> dict:
+    """
+    Runs the warm-up `steps`, (name, function) pairs, in order and logs their durations.
+
+    Runs only when AGENT_WARMUP is enabled or `force` is set. Failures are logged, never raised,
+    so a warm-up problem cannot keep the replica from starting.
+
+    Returns:
+        The duration in seconds of each warm-up step that succeeded.
+    """
+    timings = {}
+    if not (AGENT_WARMUP or force):
+        return timings
+    for name, fn in steps:
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            continue
+        timings[name] = time.perf_counter() - started
+    logger.info(f"Warm-up done: { {name: round(seconds, 3) for name, seconds in timings.items()} }")
+    return timings
+
+
+def warm_up(force: bool = False) -> dict:
+    """
+    Pays the first-query costs of DatastoreService before the replica serves: credential
+    discovery and token refresh, DNS and TLS to the Discovery Engine host, and the lazy init
+    of the service. With AGENT_WARMUP_PROBE set, that query is also sent once (as the service
+    account). See run_warm_up.
+    """
+    steps = [
+        ("token", SERVICE_ACCOUNT_TOKENS.get_token),
+        # Any response keeps the TLS connection in the session pool for the first real call
+        ("connection", lambda: get_datastore_service().session.get(f"{discovery_engine_endpoint(LOCATION, DISCOVERY_ENGINE_API_ENDPOINT)}/", timeout=10).content),
+    ]
+    if AGENT_WARMUP_PROBE:
+        steps.append(("probe", lambda: get_datastore_service().retrieve(PROJECT_ID, LOCATION, DATA_STORE_ID, AGENT_WARMUP_PROBE)))
+    return run_warm_up(steps, force)
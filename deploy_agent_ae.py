@@ -2,6 +2,8 @@ import vertexai
 from vertexai import agent_engines
 import importlib
 import os
+import json
+import hashlib
 import logging
 from dotenv import load_dotenv, dotenv_values, set_key
 
@@ -15,94 +17,224 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 PROJECT_ID = os.environ["GOOGLE_CLOUD_PROJECT"]
-LOCATION = os.environ["GOOGLE_CLOUD_LOCATION"]
 STAGING_BUCKET = os.environ["STAGING_BUCKET"]
-AGENT_DISPLAY_NAME = os.environ["AGENT_DISPLAY_NAME"]
-AGENT_FOLDER = os.environ["AGENT_FOLDER"]
 PROJECT_NUMBER = os.environ["GOOGLE_CLOUD_PROJECT_NUMBER"]
-
-# Deploy the agent to Agent Engine
-def deploy_agent():
-
-    root_agent = importlib.import_module(f"{AGENT_FOLDER}.agent")
-    root_agent = root_agent.root_agent
-
-    # Load the agent from the AGENT_FOLDER folder
-    app = agent_engines.AdkApp(
+# Defaults of deploy_agent/update_agent; deploy_fleet.py passes its own per target
+LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION")
+AGENT_DISPLAY_NAME = os.getenv("AGENT_DISPLAY_NAME")
+AGENT_FOLDER = os.getenv("AGENT_FOLDER")
+
+# Env variables forwarded to the deployed agent
+KEYS_TO_COPY = ["MODEL", "AGENT_APP_NAME", "DATASTORE_LOCATION", "DATASTORE_ID", "AGENT_AUTH_OBJECT_ID", "AGENTSPACE_APP_ID_SEARCH", "ANSWER_CACHE_SIZE", "ANSWER_CACHE_TTL", "SEMANTIC_CACHE_SIZE", "SEMANTIC_CACHE_THRESHOLD", "RETRIEVAL_STRATEGY", "RETRIEVAL_PRIMARY", "HEDGE_PERCENTILE", "HEDGE_DEFAULT_DELAY", "DATASTORE_CONNECT_TIMEOUT", "ANSWER_TIMEOUT", "STREAM_ASSIST_TIMEOUT", "DATASTORE_LATENCY_TARGET", "DISCOVERY_SESSION_AFFINITY", "DISCOVERY_SESSION_TTL", "DISCOVERY_SESSION_CACHE_SIZE", "AGENT_LOG_SAMPLE_RATE", "AGENT_LOG_MAX_CHARS", "AGENT_LOG_FORMAT", "AGENT_LOG_QUEUE", "DISCOVERY_ENGINE_GZIP", "JSON_CODEC", "AGENT_WARMUP", "AGENT_WARMUP_PROBE"]
+# Local record of what was deployed to each reasoning engine
+MANIFEST_PATH = ".deploy_manifest.json"
+# Env variable carrying the manifest hash on the deployed resource
+DEPLOY_HASH_KEY = "AGENT_DEPLOY_HASH"
+# Modules shared by the agents, shipped next to the agent package
+COMMON_MODULES = ["discovery_common.py", "datastore_service.py"]
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _agent_env_vars():
+    # Get the env variables to send in the agent deploy; a bare KEY line in .env has no value to send
+    agent_env_vars = dict(dotenv_values(".env"))
+    return dict((k, agent_env_vars[k]) for k in KEYS_TO_COPY if agent_env_vars.get(k) is not None)
+
+
+def build_manifest(agent_env_vars, agent_folder, location, display_name):
+    """
+    Describes everything a deploy depends on: the agent sources, this script (it defines
+    the deployed app class and the forwarded keys), the env variables exactly as they are
+    sent to the agent (hashed, so secrets are not written to disk) and the agent config.
+
+    Returns:
+        The manifest dict, with its overall content hash under "hash".
+    """
+    files = {name: _sha256_file(os.path.join("./", agent_folder, name)) for name in ("agent.py", "requirements.txt")}
+    files.update((name, _sha256_file(os.path.join("./", name))) for name in COMMON_MODULES)
+    files[os.path.basename(__file__)] = _sha256_file(__file__)
+    manifest = {
+        "files": files,
+        "env": {k: hashlib.sha256(v.encode()).hexdigest() for k, v in sorted(agent_env_vars.items())},
+        "config": {
+            "agent_folder": agent_folder,
+            "display_name": display_name,
+            "project": PROJECT_ID,
+            "location": location,
+            "enable_tracing": True,
+        },
+    }
+    manifest["hash"] = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+    return manifest
+
+
+def diff_manifests(old, new):
+    """
+    Lists the differences between two manifests, e.g. "files.agent.py changed".
+    """
+    if not old:
+        return ["no previous deploy manifest"]
+    changes = []
+    for section in ("files", "env", "config"):
+        before, after = old.get(section, {}), new.get(section, {})
+        for key in sorted(set(before) | set(after)):
+            if key not in before:
+                changes.append(f"{section}.{key} added")
+            elif key not in after:
+                changes.append(f"{section}.{key} removed")
+            elif before[key] != after[key]:
+                changes.append(f"{section}.{key} changed")
+    return changes
+
+
+def _load_manifests():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def record_manifest(resource_name, manifest):
+    manifests = _load_manifests()
+    manifests[resource_name] = manifest
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifests, f, indent=2, sort_keys=True)
+
+
+def _deployed_hash(resource_name):
+    # Read the hash recorded on the deployed resource, so a stale local manifest cannot cause a skip.
+    try:
+        remote_app = agent_engines.get(resource_name)
+        for env_var in remote_app.gca_resource.spec.deployment_spec.env:
+            if env_var.name == DEPLOY_HASH_KEY:
+                return env_var.value
+    except Exception as e:
+        logger.warning(f"Could not read the deployed manifest hash of {resource_name}: {e}")
+    return None
+
+
+def _is_up_to_date(resource_name, manifest):
+    previous = _load_manifests().get(resource_name)
+    changes = diff_manifests(previous, manifest)
+    if previous and not changes and _deployed_hash(resource_name) == manifest["hash"]:
+        logger.info(f"{resource_name} is up to date (manifest {manifest['hash'][:12]}), skipping deploy")
+        return True
+    if previous and not changes:
+        changes = ["deployed resource does not carry the current manifest hash"]
+    logger.info(f"Changes since the last deploy of {resource_name}: {', '.join(changes)}")
+    return False
+
+
+def _force():
+    return os.getenv("FORCE_DEPLOY", "").lower() in ("1", "true", "yes")
+
+
+def _build_app(agent_folder, location):
+    agent_module = importlib.import_module(f"{agent_folder}.agent")
+    root_agent = agent_module.root_agent
+    warm_up = getattr(agent_module, "warm_up", None)
+
+    # Defined here so cloudpickle ships the class by value; the replica only has the agent package.
+    # agent_engines.create() deploys app.clone(), which AdkApp builds with self.__class__, so the
+    # deployed copy is still a WarmAdkApp.
+    class WarmAdkApp(agent_engines.AdkApp):
+        def set_up(self):
+            super().set_up()
+            # The replica reports ready only after set_up, so the first query skips the cold path
+            if warm_up is not None:
+                warm_up()
+
+    # Load the agent from the agent folder
+    app = WarmAdkApp(
         agent=root_agent,
         enable_tracing=True,
     )
 
     vertexai.init(
         project=PROJECT_ID,
-        location=LOCATION,
+        location=location,
         staging_bucket="gs://"+STAGING_BUCKET,
     )
+    return app
 
-    # Get the env variables to send in the agent deploy
-    agent_env_vars = dict(dotenv_values(".env"))
-    keys_to_copy = ["MODEL", "AGENT_APP_NAME", "DATASTORE_LOCATION", "DATASTORE_ID", "AGENT_AUTH_OBJECT_ID", "AGENTSPACE_APP_ID_SEARCH"]
-    agent_env_vars = dict((k, agent_env_vars[k]) for k in keys_to_copy if k in agent_env_vars)
-
-    logger.info(os.path.join("./", AGENT_FOLDER, 'agent.py'))
-    logger.info(f"AGENT_DISPLAY_NAME: {AGENT_DISPLAY_NAME}")
-
-    remote_app = agent_engines.create(
-        app,
-        requirements=os.path.join("./", AGENT_FOLDER, 'requirements.txt'),
-        extra_packages=[os.path.join("./", AGENT_FOLDER, 'agent.py')],
-        display_name=AGENT_DISPLAY_NAME,
-        env_vars=agent_env_vars
-    )
 
-    resource_name = remote_app.resource_name
+def reasoning_engine_resource_name(location, reasoning_engine_id):
+    return f"projects/{PROJECT_NUMBER}/locations/{location}/reasoningEngines/{reasoning_engine_id}"
 
-    logger.info(f"Resource name: {resource_name}")
 
-    # Save the Reasoning Engine ID to the .env file
-    set_key(dotenv_path=".env", key_to_set="REASONING_ENGINE_ID", value_to_set=resource_name.split('/')[-1])
+def deploy_target(agent_folder, location, display_name, reasoning_engine_id=None, create=False, force=False,
+                  save_manifest=True):
+    """
+    Deploys one agent folder to one region without touching the .env file. The deploy is
+    skipped when `reasoning_engine_id` already runs this exact content; otherwise that
+    reasoning engine is updated, or a new one is created when there is none or `create` is set.
 
+    vertexai.init() is process wide, so concurrent targets must run in separate processes;
+    those pass save_manifest=False and let the parent process record the manifests.
 
-# Update the agent in Agent Engine
-def update_agent():
+    Returns:
+        A (resource name, manifest) tuple.
+    """
+    agent_env_vars = _agent_env_vars()
+    manifest = build_manifest(agent_env_vars, agent_folder, location, display_name)
 
-    root_agent = importlib.import_module(f"{AGENT_FOLDER}.agent")
-    root_agent = root_agent.root_agent
+    logger.info(dict(agent_env_vars))
 
-    # Load the agent from the AGENT_FOLDER folder
-    app = agent_engines.AdkApp(
-        agent=root_agent,
-        enable_tracing=True,
-    )
+    resource_name = reasoning_engine_resource_name(location, reasoning_engine_id) if reasoning_engine_id else None
+    if resource_name and not (force or _force()):
+        vertexai.init(project=PROJECT_ID, location=location)
+        if _is_up_to_date(resource_name, manifest):
+            return resource_name, manifest
 
-    vertexai.init(
-        project=PROJECT_ID,
-        location=LOCATION,
-        staging_bucket="gs://"+STAGING_BUCKET,
+    app = _build_app(agent_folder, location)
+
+    logger.info(os.path.join("./", agent_folder, 'agent.py'))
+    logger.info(f"AGENT_DISPLAY_NAME: {display_name}")
+
+    deploy_args = dict(
+        requirements=os.path.join("./", agent_folder, 'requirements.txt'),
+        extra_packages=[os.path.join("./", agent_folder, 'agent.py')] + [os.path.join("./", name) for name in COMMON_MODULES],
+        display_name=display_name,
+        env_vars=dict(agent_env_vars, **{DEPLOY_HASH_KEY: manifest["hash"]})
     )
+    if resource_name and not create:
+        remote_app = agent_engines.update(app, resource_name=resource_name, **deploy_args)
+    else:
+        remote_app = agent_engines.create(app, **deploy_args)
 
-    # Get the env variables to send in the agent deploy
-    agent_env_vars = dict(dotenv_values(".env"))
-    keys_to_copy = ["MODEL", "AGENT_APP_NAME", "DATASTORE_LOCATION", "DATASTORE_ID", "AGENT_AUTH_OBJECT_ID", "AGENTSPACE_APP_ID_SEARCH"]
-    agent_env_vars = new_dict = dict((k, agent_env_vars[k]) for k in keys_to_copy if k in agent_env_vars)
+    resource_name = remote_app.resource_name
 
-    logger.info(dict(agent_env_vars))
+    logger.info(f"Resource name: {resource_name}")
+    if save_manifest:
+        record_manifest(resource_name, manifest)
+    return resource_name, manifest
 
-    REASONING_ENGINE_ID = os.environ["REASONING_ENGINE_ID"]
-    resource_name = f"projects/{PROJECT_NUMBER}/locations/{LOCATION}/reasoningEngines/{REASONING_ENGINE_ID}"
 
-    remote_app = agent_engines.update(
-        app,
-        resource_name=resource_name,
-        requirements=os.path.join("./", AGENT_FOLDER, 'requirements.txt'),
-        extra_packages=['agent.py'],
-        display_name=AGENT_DISPLAY_NAME,
-        env_vars=agent_env_vars
+# Deploy the agent to Agent Engine
+def deploy_agent(force=False):
+
+    # Skip the create when the agent in REASONING_ENGINE_ID already runs this exact content
+    resource_name, _ = deploy_target(
+        AGENT_FOLDER, LOCATION, AGENT_DISPLAY_NAME, os.getenv("REASONING_ENGINE_ID"), create=True, force=force
     )
 
-    resource_name = remote_app.resource_name
+    # Save the Reasoning Engine ID to the .env file
+    set_key(dotenv_path=".env", key_to_set="REASONING_ENGINE_ID", value_to_set=resource_name.split('/')[-1])
 
-    logger.info(f"Resource name: {resource_name}")
+
+# Update the agent in Agent Engine
+def update_agent(force=False):
+
+    resource_name, _ = deploy_target(
+        AGENT_FOLDER, LOCATION, AGENT_DISPLAY_NAME, os.environ["REASONING_ENGINE_ID"], force=force
+    )
 
     # Save the Reasoning Engine ID to the .env file
-    set_key(dotenv_path=".env", key_to_set="REASONING_ENGINE_ID", value_to_set=resource_name.split('/')[-1])
\ No newline at end of file
+    set_key(dotenv_path=".env", key_to_set="REASONING_ENGINE_ID", value_to_set=resource_name.split('/')[-1])
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv, set_key
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configure the logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Comma separated agent folders and regions; every folder is deployed to every region
+FLEET_AGENT_FOLDERS = [f.strip() for f in os.getenv("FLEET_AGENT_FOLDERS", os.getenv("AGENT_FOLDER", "")).split(",") if f.strip()]
+FLEET_LOCATIONS = [l.strip() for l in os.getenv("FLEET_LOCATIONS", os.getenv("GOOGLE_CLOUD_LOCATION", "")).split(",") if l.strip()]
+# Upper bound of deploys running at the same time
+FLEET_WORKERS = int(os.getenv("FLEET_WORKERS", 4))
+# Display name of each reasoning engine, formatted with display_name, agent_folder and location
+FLEET_DISPLAY_NAME = os.getenv("FLEET_DISPLAY_NAME", "{display_name}-{agent_folder}-{location}")
+# Reasoning engine IDs of the fleet, read to update existing engines and rewritten at the end
+FLEET_RESULTS_PATH = os.getenv("FLEET_RESULTS_PATH", ".deploy_fleet.json")
+
+
+def target_key(agent_folder, location):
+    return f"{agent_folder}@{location}"
+
+
+def load_results():
+    if not os.path.exists(FLEET_RESULTS_PATH):
+        return {}
+    with open(FLEET_RESULTS_PATH) as f:
+        return json.load(f)
+
+
+def _deploy_worker(agent_folder, location, display_name, reasoning_engine_id, force):
+    # Runs in a pool process: vertexai.init() is process wide, so each target gets its own.
+    import deploy_agent_ae
+
+    return deploy_agent_ae.deploy_target(
+        agent_folder, location, display_name, reasoning_engine_id, force=force, save_manifest=False
+    )
+
+
+async def deploy_fleet(agent_folders=None, locations=None, workers=None, force=False):
+    """
+    Deploys every agent folder to every location concurrently, at most `workers` at a time.
+    A target found in FLEET_RESULTS_PATH is updated (or skipped when unchanged), any other
+    target is created. The results file is written once all deploys have finished.
+
+    Args:
+        agent_folders: Agent folders to deploy, defaults to FLEET_AGENT_FOLDERS.
+        locations: Regions to deploy to, defaults to FLEET_LOCATIONS.
+        workers: Maximum number of concurrent deploys, defaults to FLEET_WORKERS.
+        force: Deploy even when the deploy manifest shows no change.
+
+    Returns:
+        A dict with the reasoning engine ID of each "agent_folder@location" target, and the
+        error message of each failed target under "errors".
+    """
+    import deploy_agent_ae
+
+    agent_folders = agent_folders or FLEET_AGENT_FOLDERS
+    locations = locations or FLEET_LOCATIONS
+    targets = [(folder, location) for folder in agent_folders for location in locations]
+    if not targets:
+        raise ValueError("No deploy targets, set FLEET_AGENT_FOLDERS and FLEET_LOCATIONS")
+
+    previous = load_results().get("reasoning_engines", {})
+    results = {"reasoning_engines": dict(previous), "errors": {}}
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+
+    # spawn keeps the workers free of the parent's gRPC and auth state
+    with ProcessPoolExecutor(
+        max_workers=min(workers or FLEET_WORKERS, len(targets)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+
+        async def run(folder, location):
+            key = target_key(folder, location)
+            display_name = FLEET_DISPLAY_NAME.format(
+                display_name=deploy_agent_ae.AGENT_DISPLAY_NAME or folder, agent_folder=folder, location=location
+            )
+            target_started = time.monotonic()
+            try:
+                resource_name, manifest = await loop.run_in_executor(
+                    pool, _deploy_worker, folder, location, display_name, previous.get(key), force
+                )
+            except Exception as e:
+                logger.error(f"{key} failed after {time.monotonic() - target_started:.0f}s: {e}")
+                results["errors"][key] = str(e)
+                return
+            # Manifests are recorded here, the workers would race on the same file
+            deploy_agent_ae.record_manifest(resource_name, manifest)
+            results["reasoning_engines"][key] = resource_name.split('/')[-1]
+            logger.info(f"{key} done in {time.monotonic() - target_started:.0f}s: {resource_name}")
+
+        await asyncio.gather(*(run(folder, location) for folder, location in targets))
+
+    logger.info(f"Fleet of {len(targets)} targets deployed in {time.monotonic() - started:.0f}s, {len(results['errors'])} failed")
+
+    with open(FLEET_RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    # A single target keeps working with the scripts reading REASONING_ENGINE_ID
+    if len(targets) == 1 and not results["errors"]:
+        set_key(dotenv_path=".env", key_to_set="REASONING_ENGINE_ID",
+                value_to_set=results["reasoning_engines"][target_key(*targets[0])])
+    return results
+
+
+if __name__ == "__main__":
+    fleet = asyncio.run(deploy_fleet(force=os.getenv("FORCE_DEPLOY", "").lower() in ("1", "true", "yes")))
+    print(json.dumps(fleet, indent=2))
+    if fleet["errors"]:
+        raise SystemExit(1)
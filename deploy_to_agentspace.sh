@@ -3,7 +3,9 @@
 if [ "$DEPLOY_ACTION" == "deploy" ]; then
     python3 -c "import deploy_agent_ae; deploy_agent_ae.deploy_agent()"
 elif [ "$DEPLOY_ACTION" == "update" ]; then
-    python3 -c "import deploy_agent_ae.py; deploy_agent_ae.update_agent()"
+    python3 -c "import deploy_agent_ae; deploy_agent_ae.update_agent()"
+elif [ "$DEPLOY_ACTION" == "fleet" ]; then
+    python3 "deploy_fleet.py"
 fi
 # Authorization action options
 case $AUTH_ACTION in
@@ -21,4 +23,7 @@ case $AUTH_ACTION in
         python3 "03_register_authorization_resource.py"
         python3 "04_register_agentoauth.py"
         ;;
+    "reconcile")
+        python3 "reconcile_agentspace.py" "${AGENTSPACE_SPEC:-agentspace.yaml}"
+        ;;
 esac
\ No newline at end of file
@@ -0,0 +1,861 @@
+"""
+Building blocks shared by the agents (RAG_app, no_llm) and agentspace_manager.py for
+talking to Discovery Engine: the JSON codec and streamed-array parser, the streamAssist
+answer extraction, token, session and answer caches, call coalescing, logging and telemetry.
+
+deploy_agent_ae.py ships this module next to the agent package, so it must stay importable
+without the agents' optional dependencies: requests, google.auth and opentelemetry are
+imported on first use.
+"""
+import os
+import re
+import json
+import codecs
+import time
+import random
+import datetime
+import threading
+import collections
+import contextlib
+import hashlib
+import logging
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# ADK session state key holding the Discovery Engine session of a conversation, see DiscoverySessionMap
+DISCOVERY_SESSION_STATE_KEY = "discovery_engine_session"
+
+# Reports the remaining lifetime of a user OAuth token, see token_expires_in
+TOKENINFO_URL = "https://oauth2.googleapis.com/tokeninfo"
+
+# Characters that change the JSON nesting state while scanning a streamed response.
+_JSON_STRUCTURE = re.compile(r'[\[\]{}"\\]')
+_JSON_STRING_STATE = re.compile(r'["\\]')
+_WORD = re.compile(r"\w+")
+
+
+class JsonCodec:
+    """
+    Encodes request bodies and decodes response bodies with orjson when it is installed
+    and `name` allows it ("auto" or "orjson"), otherwise with the standard json module.
+    The choice is made on first use, so importing this module does not import orjson; a
+    `name` of None reads it then from the JSON_CODEC env variable, after .env was loaded.
+    """
+
+    def __init__(self, name: str = None):
+        self.name = name
+        self._dumps = None
+        self._loads = None
+
+    def _resolve(self):
+        self.name = self.name or os.getenv("JSON_CODEC", "auto")
+        if self.name in ("auto", "orjson"):
+            try:
+                import orjson
+            except ImportError:
+                if self.name == "orjson":
+                    raise
+            else:
+                self._loads, self._dumps, self.name = orjson.loads, orjson.dumps, "orjson"
+                return
+        self._loads = json.loads
+        self._dumps = lambda obj: json.dumps(obj, separators=(",", ":")).encode()
+        self.name = "json"
+
+    def dumps(self, obj) -> bytes:
+        if self._dumps is None:
+            self._resolve()
+        return self._dumps(obj)
+
+    def loads(self, data):
+        """
+        Decodes `data`, a str or UTF-8 bytes.
+        """
+        if self._loads is None:
+            self._resolve()
+        return self._loads(data)
+
+
+class JsonArrayParser:
+    """
+    Push parser for a streamed JSON array: feed it raw body chunks and it returns each
+    element as soon as it is complete, keeping only the element in progress in memory.
+    """
+
+    def __init__(self, codec: JsonCodec = None):
+        self.codec = codec or JSON_CODEC
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._start = None
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Parses one body chunk.
+
+        Args:
+            chunk: The next raw chunk of the response body.
+
+        Returns:
+            The array elements completed by this chunk, in order.
+        """
+        elements = []
+        buffer = self._buffer + self._decoder.decode(chunk)
+        pos = len(self._buffer)
+        start = self._start
+        while pos < len(buffer):
+            if self._escaped:
+                self._escaped = False
+                pos += 1
+                continue
+            pattern = _JSON_STRING_STATE if self._in_string else _JSON_STRUCTURE
+            match = pattern.search(buffer, pos)
+            if match is None:
+                break
+            pos = match.end()
+            char = match.group()
+            if char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = not self._in_string
+            elif char in "[{":
+                self._depth += 1
+                if self._depth == 2:
+                    start = match.start()
+            else:
+                self._depth -= 1
+                if self._depth == 1 and start is not None:
+                    elements.append(self.codec.loads(buffer[start:pos]))
+                    start = None
+        # Drop what has already been parsed so the buffer only holds the element in progress.
+        if start is None:
+            self._buffer = ""
+        else:
+            self._buffer = buffer[start:]
+            start = 0
+        self._start = start
+        return elements
+
+
+def iter_json_array(byte_chunks, codec: JsonCodec = None):
+    """
+    Incrementally parses a streamed JSON array, yielding each element as soon as it is complete.
+
+    Args:
+        byte_chunks: An iterable of raw response body chunks.
+        codec: The JsonCodec decoding the elements, JSON_CODEC by default.
+
+    Yields:
+        The decoded array elements, in order.
+    """
+    parser = JsonArrayParser(codec)
+    for chunk in byte_chunks:
+        yield from parser.feed(chunk)
+
+
+class StreamAssistResult:
+    """
+    The assembled answer of a streamAssist call.
+
+    Attributes:
+        text: The answer text, with thought chunks left out.
+        references: The grounding references, deduplicated, in the order they were cited.
+        time_to_first_chunk: Seconds from the request to the first answer chunk, or None if there was none.
+        total_time: Seconds from the request to the end of the response.
+        backend: The endpoint that produced the answer, "streamAssist" or "answer".
+        session: The Discovery Engine session that produced the answer, if the API reported one.
+    """
+
+    __slots__ = ("text", "references", "time_to_first_chunk", "total_time", "backend", "session")
+
+    def __init__(self, text: str, references: list, time_to_first_chunk: float, total_time: float, backend: str = "streamAssist",
+                 session: str = None):
+        self.text = text
+        self.references = references
+        self.time_to_first_chunk = time_to_first_chunk
+        self.total_time = total_time
+        self.backend = backend
+        self.session = session
+
+    def without_session(self) -> "StreamAssistResult":
+        """
+        Returns a copy that is not tied to a conversation, for the caches shared by all sessions.
+        """
+        return StreamAssistResult(self.text, self.references, self.time_to_first_chunk, self.total_time, self.backend)
+
+    def to_dict(self) -> dict:
+        return {
+            "answer": self.text,
+            "references": self.references,
+            "time_to_first_chunk": self.time_to_first_chunk,
+            "total_time": self.total_time,
+            "backend": self.backend,
+        }
+
+
+class StreamAssistExtractor:
+    """
+    Single-pass extractor of answer chunks and grounding references from streamAssist
+    response elements. Chunks are collected in a list and joined once in `result()`.
+    """
+
+    __slots__ = ("chunks", "references", "session", "_seen_references", "_started", "_first_chunk_at")
+
+    def __init__(self):
+        self.chunks = []
+        self.session = None
+        self.references = []
+        self._seen_references = set()
+        self._started = time.perf_counter()
+        self._first_chunk_at = None
+
+    def feed(self, element: dict) -> list:
+        """
+        Extracts one streamAssist response element.
+
+        Args:
+            element: A decoded element of the streamed JSON array.
+
+        Returns:
+            The new non-thought answer chunks found in the element.
+        """
+        texts = []
+        self.session = element.get("sessionInfo", {}).get("session", self.session)
+        for reply in element.get("answer", {}).get("replies", []):
+            grounded = reply.get("groundedContent", {})
+            content = grounded.get("content")
+            if content and "thought" not in content and "text" in content:
+                texts.append(content["text"])
+            for reference in grounded.get("textGroundingMetadata", {}).get("references", []):
+                metadata = reference.get("documentMetadata", {})
+                key = metadata.get("uri") or metadata.get("document")
+                if key and key not in self._seen_references:
+                    self._seen_references.add(key)
+                    self.references.append({
+                        "title": metadata.get("title"),
+                        "uri": metadata.get("uri"),
+                        "document": metadata.get("document"),
+                    })
+        if texts:
+            if self._first_chunk_at is None:
+                self._first_chunk_at = time.perf_counter()
+            self.chunks.extend(texts)
+        return texts
+
+    @property
+    def time_to_first_chunk(self) -> float:
+        """
+        Seconds from the extractor's creation to the first answer chunk, None before it.
+        """
+        return self._first_chunk_at - self._started if self._first_chunk_at is not None else None
+
+    def result(self) -> StreamAssistResult:
+        """
+        Returns the assembled answer.
+        """
+        return StreamAssistResult(
+            text=" ".join(self.chunks),
+            references=self.references,
+            time_to_first_chunk=self.time_to_first_chunk,
+            total_time=time.perf_counter() - self._started,
+            session=self.session,
+        )
+
+
+class ServiceAccountTokenCache:
+    """
+    Caches the Application Default Credentials token until shortly before it expires.
+
+    Credentials are discovered once per process; the lock makes concurrent callers share
+    a single refresh.
+    """
+
+    def __init__(self, refresh_margin: float = 300.0):
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._creds = None
+        self._auth_req = None
+
+    def peek(self) -> str:
+        """
+        Returns the cached token if it is still fresh, otherwise None. Never blocks on I/O.
+        """
+        creds = self._creds
+        if creds is None or not creds.token:
+            return None
+        if creds.expiry is not None:
+            # google-auth keeps expiry as a naive UTC datetime.
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if (creds.expiry - now).total_seconds() <= self.refresh_margin:
+                return None
+        return creds.token
+
+    def get_token(self) -> str:
+        """
+        Returns a fresh token, discovering or refreshing the credentials when needed.
+        """
+        token = self.peek()
+        if token:
+            return token
+        with self._lock:
+            token = self.peek()
+            if token:
+                return token
+            if self._creds is None:
+                import google.auth
+                import google.auth.transport.requests
+                self._creds, project_id = google.auth.default()
+                self._auth_req = google.auth.transport.requests.Request()  # Use google.auth here
+            self._creds.refresh(self._auth_req)
+            return self._creds.token
+
+
+def token_expires_in(token: str, timeout: float = 5.0) -> float:
+    """
+    Asks Google's tokeninfo endpoint how many seconds the OAuth `token` is still valid:
+    0 when it rejects the token, None when it cannot tell (unreachable, unexpected reply).
+    """
+    import requests
+    try:
+        response = requests.post(TOKENINFO_URL, data={"access_token": token}, timeout=timeout)
+    except requests.RequestException as e:
+        logger.warning("Could not introspect a user token: %r", e)
+        return None
+    if response.status_code == 400:
+        return 0.0
+    try:
+        response.raise_for_status()
+        return float(response.json()["expires_in"])
+    except (requests.RequestException, KeyError, TypeError, ValueError) as e:
+        logger.warning("Could not introspect a user token: %r", e)
+        return None
+
+
+class UserTokenCache:
+    """
+    Small bounded LRU map of the per-user OAuth tokens found in `temp:{AUTH_NAME}` state,
+    served until `refresh_margin` seconds before the token expires.
+
+    The expiry is the `expires_in` given to `put` when the caller knows it. Otherwise `put`
+    asks `introspect` (the tokeninfo endpoint by default) once, on `executor` (a background
+    thread by default), so no request waits for it. A token whose expiry is not known, or
+    that `introspect` rejects or cannot vouch for, is never served: callers fall back to the
+    service account as they do without a user token. `discard` drops a token Discovery
+    Engine rejected.
+    """
+
+    def __init__(self, max_size: int = 256, refresh_margin: float = 60.0, introspect=None, executor=None):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self.introspect = introspect or token_expires_in
+        self._executor = executor
+        self._lock = threading.Lock()
+        # user_id -> (token, monotonic expiry or None until known)
+        self._tokens = collections.OrderedDict()
+
+    def put(self, user_id: str, token: str, expires_in: float = None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._tokens.get(user_id)
+            known = entry is not None and entry[0] == token
+            expires_at = entry[1] if known else None
+            if expires_in is not None:
+                expires_at = now + expires_in
+            self._tokens[user_id] = (token, expires_at)
+            self._tokens.move_to_end(user_id)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+            if expires_at is None and not known:
+                if self._executor is None:
+                    import concurrent.futures
+                    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-introspect")
+                self._executor.submit(self._record_expiry, user_id, token)
+
+    def _record_expiry(self, user_id: str, token: str):
+        started = time.monotonic()
+        expires_in = self.introspect(token)
+        with self._lock:
+            entry = self._tokens.get(user_id)
+            if entry is None or entry[0] != token or entry[1] is not None:
+                return
+            if expires_in:
+                self._tokens[user_id] = (token, started + expires_in)
+            else:
+                del self._tokens[user_id]
+
+    def get(self, user_id: str) -> str:
+        """
+        Returns the cached token if its expiry is known and still ahead, otherwise None.
+        Never blocks on I/O.
+        """
+        with self._lock:
+            entry = self._tokens.get(user_id)
+            if entry is None or entry[1] is None:
+                return None
+            token, expires_at = entry
+            if time.monotonic() >= expires_at - self.refresh_margin:
+                del self._tokens[user_id]
+                return None
+            self._tokens.move_to_end(user_id)
+            return token
+
+    def discard(self, token: str):
+        """
+        Drops `token` for every user it is cached for, e.g. after Discovery Engine answered
+        HTTP 401 to it.
+        """
+        with self._lock:
+            for user_id in [user_id for user_id, entry in self._tokens.items() if entry[0] == token]:
+                del self._tokens[user_id]
+
+
+class DiscoverySessionMap:
+    """
+    Bounded LRU map of ADK session IDs to the Discovery Engine assistant session holding
+    their conversation, so follow-up turns reuse the server-side context.
+
+    The mapping is also kept in the ADK session state under DISCOVERY_SESSION_STATE_KEY,
+    so it survives this replica; `put` returns the value to store there. A mapping unused
+    for `ttl` seconds expires and the next turn starts a new Discovery Engine session.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 1800.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = collections.OrderedDict()
+
+    def get(self, adk_session_id: str, state_value: dict = None) -> str:
+        """
+        Returns the Discovery Engine session of `adk_session_id`, looked up in memory and
+        then in `state_value` (the session state entry), or None when there is none or it expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(adk_session_id)
+            if entry is None and isinstance(state_value, dict) and state_value.get("name"):
+                entry = (state_value["name"], state_value.get("used_at", 0.0))
+            if entry is None:
+                return None
+            name, used_at = entry
+            if now - used_at > self.ttl:
+                self._sessions.pop(adk_session_id, None)
+                return None
+            self._sessions[adk_session_id] = (name, used_at)
+            self._sessions.move_to_end(adk_session_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+            return name
+
+    def put(self, adk_session_id: str, discovery_session: str) -> dict:
+        """
+        Records that `adk_session_id` continues in `discovery_session`.
+
+        Returns:
+            The value to store in the ADK session state under DISCOVERY_SESSION_STATE_KEY.
+        """
+        used_at = time.time()
+        with self._lock:
+            self._sessions[adk_session_id] = (discovery_session, used_at)
+            self._sessions.move_to_end(adk_session_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+        return {"name": discovery_session, "used_at": used_at}
+
+    def forget(self, adk_session_id: str):
+        with self._lock:
+            self._sessions.pop(adk_session_id, None)
+
+
+class AnswerCache:
+    """
+    Size-bounded LRU cache with TTL for Discovery Engine answers.
+
+    Keys combine the endpoint, the normalized query text, the datastore/app ID and an
+    identity scope derived from the access token, so answers fetched with one user's
+    OAuth token are never served to another user.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # Case, accents and punctuation do not change the question: "Qual é a missão?" == "qual e a missao"
+        decomposed = unicodedata.normalize("NFKD", query.casefold())
+        return " ".join(_WORD.findall("".join(c for c in decomposed if not unicodedata.combining(c))))
+
+    @staticmethod
+    def identity_scope(access_token: str) -> str:
+        return hashlib.sha256(access_token.encode()).hexdigest()[:16] if access_token else "anonymous"
+
+    def key(self, endpoint: str, query: str, resource_id: str, access_token: str) -> tuple:
+        return (endpoint, self.normalize_query(query), resource_id, self.identity_scope(access_token))
+
+    def get(self, key: tuple):
+        """
+        Returns the cached value for `key`, or None on a miss or an expired entry.
+        """
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller runs the call and every caller
+    arriving with the same key while it is in flight waits for, and shares, its outcome.
+    """
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn, share=None):
+        """
+        Runs `fn()` unless a call with the same key is already in flight, in which case
+        its result is returned (or its exception raised) instead.
+
+        `share`, when given, maps the result before it is handed to the other callers, e.g. to
+        drop what belongs to the caller that ran it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            result = fn()
+            call.result = share(result) if share is not None else result
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class LatencyStats:
+    """
+    Sliding window of the latencies of one retrieval backend, used to derive hedge delays.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = collections.deque(maxlen=window)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        """
+        Returns the p-th percentile of the window, or None until `min_samples` were recorded.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class StructuredLog:
+    """
+    Hot-path logging of the datastore calls: one record per event, with its fields capped
+    at `max_chars` characters and sampled at `sample_rate`, rendered as JSON (or key=value)
+    and also attached as `json_fields` for Cloud Logging.
+
+    With `use_queue`, the first record moves the module logger onto a QueueHandler and a
+    QueueListener thread forwards its records to the host's root handlers, so formatting
+    and I/O happen off the request thread.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_rate: float = 1.0, max_chars: int = 1000,
+                 json_format: bool = True, use_queue: bool = True):
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.max_chars = max_chars
+        self.json_format = json_format
+        self.use_queue = use_queue
+        self._listener = None
+        self._handler = None
+        self._lock = threading.Lock()
+
+    def _install_queue(self):
+        import atexit
+        import logging.handlers
+        import queue
+
+        class RootForwarder(logging.Handler):
+            # Looks up the root handlers per record, so handlers the host adds later are used too
+            def emit(self, record):
+                logging.getLogger().handle(record)
+
+        with self._lock:
+            if self._listener is not None:
+                return
+            records = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(records, RootForwarder())
+            self._listener.start()
+            atexit.register(self.close)
+            self._handler = logging.handlers.QueueHandler(records)
+            self.logger.addHandler(self._handler)
+            self.logger.propagate = False
+
+    def close(self):
+        """
+        Flushes the queued records, stops the listener thread and logs directly again.
+        """
+        with self._lock:
+            listener, self._listener = self._listener, None
+            if listener is None:
+                return
+            self.logger.removeHandler(self._handler)
+            self.logger.propagate = True
+        listener.stop()
+
+    def truncate(self, value):
+        if isinstance(value, (bytes, bytearray)):
+            head = bytes(value[:self.max_chars]).decode("utf-8", errors="replace")
+            return head if len(value) <= self.max_chars else f"{head}...(+{len(value) - self.max_chars} bytes)"
+        if isinstance(value, str) and len(value) > self.max_chars:
+            return f"{value[:self.max_chars]}...(+{len(value) - self.max_chars} chars)"
+        return value
+
+    def __call__(self, event: str, level: int = logging.INFO, sampled: bool = True, **fields):
+        """
+        Logs `event` with its fields.
+
+        Args:
+            event: The event name, e.g. "datastore.answer".
+            level: The logging level of the record.
+            sampled: Whether the record is subject to `sample_rate`; errors usually are not.
+            **fields: The record fields. Long strings and bytes are truncated.
+        """
+        if not self.logger.isEnabledFor(level) or (sampled and self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return
+        if self.use_queue and self._listener is None:
+            self._install_queue()
+        record = {"event": event}
+        record.update((name, self.truncate(value)) for name, value in fields.items())
+        if self.json_format:
+            message = json.dumps(record, ensure_ascii=False, default=str)
+        else:
+            message = " ".join(f"{name}={value}" for name, value in record.items())
+        self.logger.log(level, message, extra={"json_fields": record})
+
+
+class Telemetry:
+    """
+    Spans and metrics for the datastore calls. They are recorded with OpenTelemetry, which
+    Agent Engine exports when the AdkApp has enable_tracing=True, and are no-ops when the
+    opentelemetry package is not installed.
+
+    Stage durations (token, connect, ttfb, ttfc, upstream, parse, emit) go to one histogram
+    keyed by a "stage" attribute and are also set on the current span; request and response
+    bodies are counted in bytes.
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._ready = False
+        self._trace = None
+        self._tracer = None
+        self._durations = None
+        self._sizes = None
+
+    def _setup(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            try:
+                from opentelemetry import metrics, trace
+            except ImportError:
+                logger.debug("opentelemetry is not installed, datastore telemetry is disabled")
+            else:
+                meter = metrics.get_meter(self.scope)
+                self._trace = trace
+                self._tracer = trace.get_tracer(self.scope)
+                self._durations = meter.create_histogram(
+                    "agent.datastore.duration", unit="s", description="Duration of each stage of a datastore call"
+                )
+                self._sizes = meter.create_counter(
+                    "agent.datastore.size", unit="By", description="Bytes sent to and received from Discovery Engine"
+                )
+            self._ready = True
+
+    @contextlib.contextmanager
+    def span(self, name: str, current: bool = True, **attributes):
+        """
+        Opens a span around the block and yields it (None without opentelemetry).
+
+        Pass current=False inside async generators: a span that is not made current
+        survives being resumed in another context.
+        """
+        self._setup()
+        if self._tracer is None:
+            yield None
+        elif current:
+            with self._tracer.start_as_current_span(name, attributes=attributes) as span:
+                yield span
+        else:
+            span = self._tracer.start_span(name, attributes=attributes)
+            try:
+                yield span
+            finally:
+                span.end()
+
+    def record(self, stage: str, seconds: float, span=None, **attributes):
+        """
+        Records how long `stage` took, on the histogram and on `span` (default: the current span).
+        """
+        self._setup()
+        if self._durations is None or seconds is None:
+            return
+        self._durations.record(seconds, dict(attributes, stage=stage))
+        span = span or self._trace.get_current_span()
+        if span.is_recording():
+            span.set_attribute(f"{stage}_seconds", seconds)
+
+    def count_bytes(self, direction: str, size: int, span=None, **attributes):
+        """
+        Adds `size` bytes sent ("request") or received ("response") to the size counter.
+        """
+        self._setup()
+        if self._sizes is None:
+            return
+        self._sizes.add(size, dict(attributes, direction=direction))
+        span = span or self._trace.get_current_span()
+        if span.is_recording():
+            span.set_attribute(f"{direction}_bytes", size)
+
+    def record_stream(self, extractor: StreamAssistExtractor, started: float, parse_time: float, response_bytes: int, span=None):
+        """
+        Records the stages of a fully read streamAssist response: time to first chunk, upstream
+        time, time spent parsing and the response size.
+        """
+        self.record("ttfc", extractor.time_to_first_chunk, span, backend="streamAssist")
+        self.record("upstream", time.perf_counter() - started, span, backend="streamAssist")
+        self.record("parse", parse_time, span, backend="streamAssist")
+        self.count_bytes("response", response_bytes, span, backend="streamAssist")
+
+    def https_adapter(self, pool_size: int):
+        """
+        Returns a pooled requests HTTPAdapter whose new HTTPS connections record their TCP and
+        TLS connect time as the "connect" stage; reused keep-alive connections record nothing.
+        """
+        import requests.adapters
+        import urllib3
+        import urllib3.connection
+
+        telemetry = self
+
+        class TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+            def connect(self):
+                started = time.perf_counter()
+                super().connect()
+                telemetry.record("connect", time.perf_counter() - started, host=self.host)
+
+        class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+            ConnectionCls = TimedHTTPSConnection
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        adapter.poolmanager.pool_classes_by_scheme = dict(adapter.poolmanager.pool_classes_by_scheme, https=TimedHTTPSConnectionPool)
+        return adapter
+
+
+JSON_CODEC = JsonCodec()
+
+
+def new_discovery_session(project_id: str, location: str, app_id: str) -> str:
+    """
+    Returns the session name asking :streamAssist of the `app_id` engine to start a new assistant session.
+    """
+    return f"projects/{project_id}/locations/{location}/collections/default_collection/engines/{app_id}/sessions/-"
+
+
+def transport_headers(gzip: bool = True) -> dict:
+    """
+    Returns the headers every Discovery Engine call carries. Google APIs only compress a
+    response when the User-Agent also mentions gzip, Accept-Encoding alone is not enough.
+    """
+    if not gzip:
+        return {}
+    return {"Accept-Encoding": "gzip", "User-Agent": "agent-engine-agentspace-deploy (gzip)"}
+
+
+def discovery_engine_endpoint(location: str, api_endpoint: str = None) -> str:
+    """
+    Returns the scheme and host serving Discovery Engine calls for `location`, or
+    `api_endpoint` when one is set (e.g. a local stand-in for benchmarks).
+    """
+    if api_endpoint:
+        return api_endpoint.rstrip("/")
+    return f"https://{location}-discoveryengine.googleapis.com"
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import statistics
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
+PROJECT_NUMBER = os.getenv("GOOGLE_CLOUD_PROJECT_NUMBER")
+LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION")
+REASONING_ENGINE_ID = os.getenv("REASONING_ENGINE_ID")
+AGENT_FOLDER = os.getenv("AGENT_FOLDER")
+STAGING_BUCKET = os.getenv("STAGING_BUCKET")
+AUTH_NAME = os.getenv("AGENT_AUTH_OBJECT_ID")
+
+
+def load_queries(path, field):
+    """
+    Reads the queries of a JSONL file: one JSON object per line holding the query under
+    `field`, or a plain JSON string. An optional "user_id" pins the query to that user.
+    """
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                queries.append({"query": item})
+            else:
+                queries.append({"query": item[field], "user_id": item.get("user_id")})
+    return queries
+
+
+def _event_text(event):
+    content = event.get("content") or {}
+    return "".join(part.get("text", "") for part in content.get("parts") or [] if not part.get("thought"))
+
+
+def _event_error(event):
+    if event.get("error_code") or event.get("error_message"):
+        return f"{event.get('error_code')}: {event.get('error_message')}"
+    return None
+
+
+class AdkAppTarget:
+    """
+    Sends queries through `async_stream_query` of an AdkApp: a local one built from
+    AGENT_FOLDER, or the deployed reasoning engine returned by `agent_engines.get`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @classmethod
+    def local(cls, agent_folder):
+        import vertexai
+        from vertexai import agent_engines
+
+        vertexai.init(project=PROJECT_ID, location=LOCATION, staging_bucket=f"gs://{STAGING_BUCKET}" if STAGING_BUCKET else None)
+        root_agent = importlib.import_module(f"{agent_folder}.agent").root_agent
+        return cls(agent_engines.AdkApp(agent=root_agent))
+
+    @classmethod
+    def remote(cls, resource_name):
+        import vertexai
+        from vertexai import agent_engines
+
+        vertexai.init(project=PROJECT_ID, location=resource_name.split("/")[3])
+        return cls(agent_engines.get(resource_name))
+
+    async def stream(self, user_id, query):
+        # No session_id: every query starts a new session, as a fresh conversation would
+        async for event in self.app.async_stream_query(user_id=user_id, message=query):
+            yield event
+
+
+class RunnerTarget:
+    """
+    Sends queries straight through an ADK Runner with in-memory sessions, without vertexai.
+    An access token is handed to the agent in `temp:` state, as Agentspace does.
+    """
+
+    def __init__(self, agent_folder, access_token=None):
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+
+        root_agent = importlib.import_module(f"{agent_folder}.agent").root_agent
+        self.session_service = InMemorySessionService()
+        self.runner = Runner(agent=root_agent, app_name="loadtest", session_service=self.session_service)
+        self.state_delta = {f"temp:{AUTH_NAME}": access_token} if access_token else None
+
+    async def stream(self, user_id, query):
+        from google.genai import types
+
+        session = await self.session_service.create_session(app_name="loadtest", user_id=user_id)
+        message = types.Content(role="user", parts=[types.Part(text=query)])
+        async for event in self.runner.run_async(user_id=user_id, session_id=session.id, new_message=message,
+                                                 state_delta=self.state_delta):
+            yield event.model_dump(mode="json", exclude_none=True)
+
+
+async def run_query(target, user_id, query):
+    """
+    Sends one query and times it.
+
+    Returns:
+        A record with the time to first text token (ttft) and end-to-end latency in seconds,
+        the answer size, and the error if the query failed.
+    """
+    record = {"user_id": user_id, "query": query, "ttft": None, "latency": None, "events": 0, "answer_chars": 0, "error": None}
+    started = time.perf_counter()
+    try:
+        async for event in target.stream(user_id, query):
+            record["events"] += 1
+            text = _event_text(event)
+            if text and record["ttft"] is None:
+                record["ttft"] = time.perf_counter() - started
+            if not event.get("partial"):
+                record["answer_chars"] += len(text)
+            record["error"] = record["error"] or _event_error(event)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency"] = time.perf_counter() - started
+    if record["error"] is None and record["ttft"] is None:
+        record["error"] = "empty answer"
+    return record
+
+
+async def run_load(target, queries, concurrency=4, ramp_up=0.0, repeat=1, user_prefix="loadtest"):
+    """
+    Replays `queries` `repeat` times with `concurrency` virtual users. Users start evenly
+    spread over `ramp_up` seconds; each has its own user ID and takes the next query as
+    soon as its previous one finishes.
+
+    Returns:
+        The per-query records, in completion order, and the wall-clock duration in seconds.
+    """
+    pending = asyncio.Queue()
+    for _ in range(repeat):
+        for item in queries:
+            pending.put_nowait(item)
+    run_id = uuid.uuid4().hex[:8]
+    records = []
+
+    async def user(n):
+        await asyncio.sleep(ramp_up * n / concurrency)
+        while True:
+            try:
+                item = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await run_query(target, item.get("user_id") or f"{user_prefix}-{run_id}-{n}", item["query"])
+            record["virtual_user"] = n
+            records.append(record)
+            status = f"ERROR {record['error']}" if record["error"] else f"ttft {record['ttft']:.2f}s"
+            print(f"[{len(records)}] user {n}: {record['latency']:.2f}s, {status}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(concurrency)))
+    return records, time.perf_counter() - started
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    summary = {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in (50, 90, 95, 99)}
+    return dict(summary, mean=statistics.fmean(ordered), max=ordered[-1])
+
+
+def summarize(records, duration):
+    succeeded = [record for record in records if not record["error"]]
+    return {
+        "queries": len(records),
+        "errors": len(records) - len(succeeded),
+        "error_rate": (len(records) - len(succeeded)) / len(records) if records else 0.0,
+        "duration": duration,
+        "throughput": len(succeeded) / duration if duration else 0.0,
+        "ttft": _percentiles([record["ttft"] for record in succeeded]),
+        "latency": _percentiles([record["latency"] for record in succeeded]),
+    }
+
+
+def print_summary(summary, baseline=None):
+    print(f"\n{summary['queries']} queries in {summary['duration']:.1f}s: {summary['throughput']:.2f} answers/s, "
+          f"{summary['errors']} errors ({summary['error_rate']:.1%})")
+    for metric in ("ttft", "latency"):
+        stats = summary[metric]
+        if not stats:
+            continue
+        before = (baseline or {}).get(metric) or {}
+        cells = []
+        for key in ("p50", "p90", "p95", "p99", "max"):
+            cell = f"{key} {stats[key]:.2f}s"
+            if before.get(key):
+                cell += f" ({(stats[key] - before[key]) / before[key]:+.0%})"
+            cells.append(cell)
+        print(f"{metric:>8}: " + ", ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL file of queries against an agent and report latency percentiles.")
+    parser.add_argument("queries", help="JSONL file, one {\"query\": ...} object (or JSON string) per line")
+    parser.add_argument("--target", choices=("remote", "local", "runner"), default="remote",
+                        help="remote: the deployed reasoning engine; local: an AdkApp built from --agent-folder; "
+                             "runner: a plain ADK Runner, without vertexai")
+    parser.add_argument("--resource-name", help="Reasoning engine resource name, defaults to REASONING_ENGINE_ID from .env")
+    parser.add_argument("--agent-folder", default=AGENT_FOLDER, help="Agent folder of the local targets, defaults to AGENT_FOLDER")
+    parser.add_argument("--access-token", default=os.getenv("LOADTEST_ACCESS_TOKEN"),
+                        help="User OAuth token passed to the runner target, defaults to LOADTEST_ACCESS_TOKEN")
+    parser.add_argument("--field", default="query", help="JSON key holding the query text")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of virtual users")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which the virtual users start")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the query file is replayed")
+    parser.add_argument("--user-prefix", default="loadtest", help="Prefix of the generated user IDs")
+    parser.add_argument("--output", help="Results file, defaults to loadtest_results/<target>-<timestamp>.json")
+    parser.add_argument("--compare", help="Earlier results file to compare the percentiles with")
+    args = parser.parse_args()
+
+    if args.target == "remote":
+        resource_name = args.resource_name or f"projects/{PROJECT_NUMBER}/locations/{LOCATION}/reasoningEngines/{REASONING_ENGINE_ID}"
+        target = AdkAppTarget.remote(resource_name)
+    elif args.target == "local":
+        resource_name = None
+        target = AdkAppTarget.local(args.agent_folder)
+    else:
+        resource_name = None
+        target = RunnerTarget(args.agent_folder, args.access_token)
+
+    queries = load_queries(args.queries, args.field)
+    records, duration = asyncio.run(run_load(target, queries, args.concurrency, args.ramp_up, args.repeat, args.user_prefix))
+    summary = summarize(records, duration)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["summary"]
+    print_summary(summary, baseline)
+
+    output = args.output or os.path.join(
+        "loadtest_results", f"{args.target}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "config": dict(vars(args), resource_name=resource_name, access_token=None),
+            "summary": summary,
+            "records": records,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
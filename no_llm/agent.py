@@ -11,126 +11,363 @@
 # limitations under the License.
 
 import logging
-from typing import AsyncGenerator
-from typing_extensions import override
-from google.adk.tools import ToolContext
-
-from google.adk.agents import BaseAgent
-from google.adk.agents.invocation_context import InvocationContext
-from google.genai import types
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.adk.events import Event
-from pydantic import BaseModel
-from typing import Any
+import typing
 
 import os
-from dotenv import load_dotenv
-from google.auth import default
-from google.auth import transport
-import requests
+import contextlib
+import time
+import threading
+import concurrent.futures
+import asyncio
+
+# The Discovery Engine service, its configuration and caches are shared with RAG_app
+from datastore_service import (
+    AGENTSPACE_APP_ID, AGENT_WARMUP_PROBE, ANSWER_CACHE, AUTH_NAME, DATA_STORE_ID, DISCOVERY_ENGINE_API_ENDPOINT,
+    DISCOVERY_ENGINE_GZIP, DISCOVERY_SESSION_AFFINITY, DISCOVERY_SESSIONS, LOCATION, LOG, PROJECT_ID,
+    SERVICE_ACCOUNT_TOKENS, TELEMETRY, USER_TOKENS, get_datastore_service, run_warm_up,
+)
+from discovery_common import (
+    DISCOVERY_SESSION_STATE_KEY, JSON_CODEC, JsonArrayParser, StreamAssistExtractor, StreamAssistResult,
+    discovery_engine_endpoint, new_discovery_session, transport_headers,
+)
 
+# google.adk, google.genai, google.auth, requests and httpx are imported on first use, so importing
+# this module stays cheap for Agent Engine cold starts and for deploy_agent_ae packaging.
+if typing.TYPE_CHECKING:
+    import httpx
+    from google.adk.tools import ToolContext
 
-# Configura o logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Logging is configured by the host (Agent Engine, adk web, the deploy script)
 logger = logging.getLogger(__name__)
 
+# Read after datastore_service loaded a local .env
 MODEL = os.getenv("MODEL")
 AGENT_APP_NAME = os.getenv("AGENT_DISPLAY_NAME")
-PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
-LOCATION = os.getenv("DATASTORE_LOCATION")
-DATA_STORE_ID = os.getenv("DATASTORE_ID")
-AUTH_NAME = os.getenv("AGENT_AUTH_OBJECT_ID")
-AGENTSPACE_APP_ID = os.getenv("AGENTSPACE_APP_ID_SEARCH")
-
-class DatastoreService:
-    def __init__(self, access_token: str):
-        self.access_token = None
-        if access_token: 
-            self.access_token = access_token
-        else: 
-            creds, project_id = default()
-            auth_req = transport.requests.Request()  # Use google.auth here
-            creds.refresh(auth_req)
-            access_token = creds.token
-            self.access_token = access_token
-
-
-    def search_datastore(self, project_id, location, datastore_id, query):
-        # Define API endpoint and headers
-        url = f"https://{location}-discoveryengine.googleapis.com/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{DATA_STORE_ID}/servingConfigs/default_search:answer"
 
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
 
-        # Define request data with placeholders for query
-        data = {
-            "query": {"text":f"{query}"},
-            "searchSpec": {
-                "searchParams": {
-                    "maxReturnResults": 5
-                }
-                }
-            }
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight. Besides `do`, it exposes `follow` and `lead` so a
+    streaming leader can forward partial output while followers wait for the final result.
 
-        # Make POST request
-        response = requests.post(url, headers=headers, json=data)
-        
-        logger.info(response.text)
-        
-        try:            
-            return response.json()['answer']['answerText']
+    Flights are thread-safe concurrent.futures.Future objects awaited through
+    asyncio.wrap_future, so callers on different event loops (AdkApp runs one per request)
+    share a call as well.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.shared = 0
+
+    async def follow(self, key):
+        """
+        Awaits the call in flight for `key`.
+
+        Returns:
+            (True, result) when a call was in flight, or (False, None) when there was none
+            or its leader gave up before finishing.
+        """
+        while True:
+            with self._lock:
+                future = self._flights.get(key)
+                if future is None:
+                    return False, None
+                self.shared += 1
+            try:
+                # Shielded: a cancelled follower must not cancel the leader's future
+                return True, await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was abandoned; look again, or let the caller run the call itself.
+
+    @contextlib.contextmanager
+    def lead(self, key):
+        """
+        Registers the caller as the leader for `key`. The leader must call `set_result` on
+        the yielded future; an exception raised in the block is shared with the followers.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._flights[key] = future
+        try:
+            yield future
         except Exception as e:
-            logger.error(e)
-            return print(f"An unexpected error occurred in the Agent: {e}")
-        
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is future:
+                    del self._flights[key]
+            if not future.done():
+                future.cancel()
+
+    async def do(self, key, fn, share=None):
+        """
+        Awaits `fn()` unless a call with the same key is already in flight, in which case
+        its outcome is shared instead. See SingleFlight.do for `share`.
+        """
+        followed, result = await self.follow(key)
+        if followed:
+            return result
+        with self.lead(key) as flight:
+            result = await fn()
+            flight.set_result(share(result) if share is not None else result)
+            return result
+
+
+ASYNC_SEARCH_FLIGHTS = AsyncSingleFlight()
+
+
+_async_client = None
+_http_loop = None
+_http_lock = threading.Lock()
+
+
+def http_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the long-lived event loop, running on its own daemon thread, that owns the shared
+    httpx.AsyncClient. AdkApp runs every request on a new event loop; the client's connections
+    are bound to one loop, so they stay on this one to be reused across requests.
+    """
+    global _http_loop
+    if _http_loop is None:
+        with _http_lock:
+            if _http_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="datastore-http", daemon=True).start()
+                _http_loop = loop
+    return _http_loop
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """
+    Returns the process-wide httpx.AsyncClient, so every AsyncDatastoreService shares one
+    keep-alive connection pool. It may be created anywhere but only used on `http_loop()`.
+    """
+    global _async_client
+    if _async_client is None:
+        with _http_lock:
+            if _async_client is None:
+                import httpx
+                _async_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                    headers=transport_headers(DISCOVERY_ENGINE_GZIP),
+                )
+    return _async_client
+
+
+async def iterate_on_http_loop(agen):
+    """
+    Runs the async generator `agen` on `http_loop()` and yields its items on the caller's loop.
+    Cancelling the caller cancels the pending step; stopping early closes `agen` there.
+    """
+    loop = http_loop()
+
+    async def step():
+        return await agen.__anext__()
+
+    try:
+        while True:
+            try:
+                item = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(step(), loop))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # Releases the upstream response when the consumer stopped early; a no-op otherwise
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop)
+
+
+class AsyncDatastoreService:
+    """
+    Non-blocking counterpart of DatastoreService for async agents: requests go through
+    the shared httpx.AsyncClient on `http_loop()` and credential refreshes run in a worker
+    thread, so the caller's event loop keeps serving other sessions during the round-trip.
+
+    Use `get_async_datastore_service()` for the process-wide instance; it shares the
+    service account and per-user token caches with DatastoreService.
+    """
+
+    def __init__(self, access_token: str = None):
+        self.access_token = access_token or None
 
-    def search_streamAssist(self, project_id, location, datastore_id, query):
-        # Define API endpoint and headers
-        url = f"https://{location}-discoveryengine.googleapis.com/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/engines/{AGENTSPACE_APP_ID}/assistants/default_assistant:streamAssist"
+    async def resolve_access_token(self, access_token: str = None, user_id: str = None) -> str:
+        """
+        Async variant of DatastoreService.resolve_access_token.
+        """
+        if access_token:
+            if user_id:
+                USER_TOKENS.put(user_id, access_token)
+            return access_token
+        if user_id:
+            cached = USER_TOKENS.get(user_id)
+            if cached:
+                return cached
+        if self.access_token:
+            return self.access_token
+        # Only a cache miss pays for the blocking refresh, and it runs off the event loop.
+        token = SERVICE_ACCOUNT_TOKENS.peek()
+        if token:
+            return token
+        with TELEMETRY.span("datastore.token"):
+            started = time.perf_counter()
+            token = await asyncio.to_thread(SERVICE_ACCOUNT_TOKENS.get_token)
+            TELEMETRY.record("token", time.perf_counter() - started, source="service_account")
+        return token
+
+    def stream_assist_url(self, project_id, location):
+        return f"{discovery_engine_endpoint(location, DISCOVERY_ENGINE_API_ENDPOINT)}/v1alpha/projects/{project_id}/locations/{location}/collections/default_collection/engines/{AGENTSPACE_APP_ID}/assistants/default_assistant:streamAssist"
+
+    async def stream_streamAssist(self, project_id, location, datastore_id, query, extractor: StreamAssistExtractor = None, access_token: str = None, span=None,
+                                  session: str = None):
+        """
+        Streams the answer of the assistant, yielding grounded-content text chunks as they arrive.
+
+        Pass an `extractor` to collect the full answer, references and timings while streaming,
+        and a `span` to record the stage timings on (the current span is not reliable across
+        the yields of an async generator). Pass the `session` of an earlier answer to continue
+        that conversation; without one (or when the API no longer knows it), a new session is
+        started with DISCOVERY_SESSION_AFFINITY and reported in `extractor.session`.
+        """
+        extractor = extractor or StreamAssistExtractor()
+        access_token = access_token or await self.resolve_access_token()
+        # The HTTP exchange runs on the shared client's loop, see http_loop
+        async for text in iterate_on_http_loop(self._stream_streamAssist(project_id, location, query, extractor, access_token, span, session)):
+            yield text
+
+    async def _stream_streamAssist(self, project_id, location, query, extractor, access_token, span, session):
+        # Runs on http_loop()
+        url = self.stream_assist_url(project_id, location)
 
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
 
-        # Define request data with placeholders for query
         data = {
             "query": {"text":f"{query}"},
-        #    "toolsSpec": {
-        #        "vertexAiSearchSpec": {
-        #            "dataStoreSpecs": [ { "dataStore": f"projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{datastore_id}" }]
-        #        }
-        #        }
             }
+        if DISCOVERY_SESSION_AFFINITY:
+            data["session"] = session or new_discovery_session(project_id, location, AGENTSPACE_APP_ID)
+
+        connect_started = None
+
+        async def trace(event, info):
+            # httpx reports the connection setup only when the pool opens a new connection
+            nonlocal connect_started
+            if event == "connection.connect_tcp.started":
+                connect_started = time.perf_counter()
+            elif event == "connection.start_tls.complete" and connect_started is not None:
+                TELEMETRY.record("connect", time.perf_counter() - connect_started, span, host=response_host)
+
+        response_host = discovery_engine_endpoint(location, DISCOVERY_ENGINE_API_ENDPOINT).split("://", 1)[-1]
+        parser = JsonArrayParser()
+        parse_time = 0.0
+        response_bytes = 0
+        started = time.perf_counter()
+        async with get_async_client().stream("POST", url, headers=headers, content=JSON_CODEC.dumps(data), extensions={"trace": trace}) as response:
+            TELEMETRY.record("ttfb", time.perf_counter() - started, span, backend="streamAssist")
+            TELEMETRY.count_bytes("request", len(response.request.content), span, backend="streamAssist")
+            # A session the API no longer knows (expired or deleted) is replaced by a new one below
+            expired_session = bool(session) and response.status_code in (400, 404)
+            if response.is_error and not expired_session:
+                if response.status_code == 401:
+                    USER_TOKENS.discard(access_token)
+                await response.aread()
+                LOG("datastore.stream_error", level=logging.ERROR, sampled=False, status=response.status_code, body=response.content)
+                return
+            if not response.is_error:
+                async for chunk in response.aiter_bytes():
+                    parse_started = time.perf_counter()
+                    response_bytes += len(chunk)
+                    texts = [text for element in parser.feed(chunk) for text in extractor.feed(element)]
+                    parse_time += time.perf_counter() - parse_started
+                    for text in texts:
+                        yield text
+                TELEMETRY.record_stream(extractor, started, parse_time, response_bytes, span)
+        if expired_session:
+            logger.warning(f"Discovery Engine session {session} was rejected, starting a new one")
+            async for text in self._stream_streamAssist(project_id, location, query, extractor, access_token, span, None):
+                yield text
+
+    async def search_streamAssist(self, project_id, location, datastore_id, query, access_token: str = None) -> StreamAssistResult:
+        access_token = access_token or await self.resolve_access_token()
+        cache_key = ANSWER_CACHE.key("streamAssist", query, AGENTSPACE_APP_ID, access_token)
+        cached = ANSWER_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            extractor = StreamAssistExtractor()
+            with TELEMETRY.span("datastore.streamAssist", backend="streamAssist") as span:
+                async for _ in self.stream_streamAssist(project_id, location, datastore_id, query, extractor, access_token, span):
+                    pass
+            result = extractor.result()
+            if result.text:
+                ANSWER_CACHE.put(cache_key, result.without_session())
+            return result
+
+        # The Discovery Engine session started by the leader stays with the leader
+        result = await ASYNC_SEARCH_FLIGHTS.do(cache_key, fetch, StreamAssistResult.without_session)
+
+        LOG("datastore.streamAssist", answer=result.text, references=len(result.references), total_time=result.total_time)
+
+        return result
+
+
+_async_datastore_service = None
+
+
+def get_async_datastore_service() -> AsyncDatastoreService:
+    """
+    Returns the process-wide AsyncDatastoreService, creating it on first use.
+    """
+    global _async_datastore_service
+    if _async_datastore_service is None:
+        _async_datastore_service = AsyncDatastoreService()
+    return _async_datastore_service
 
-        # Make POST request
-        response = requests.post(url, headers=headers, json=data)
-        
-#        try:
 
-        agentspace_answer = ""
+def _on_http_loop(coro, timeout: float = None):
+    # Blocks the calling thread until `coro` finished on http_loop(), see warm_up
+    return asyncio.run_coroutine_threadsafe(coro, http_loop()).result(timeout)
+
 
-        for r in response.json():
-            if "answer" in r:
-                if "replies" in r["answer"]:
-                    for rep in r["answer"]["replies"]:
-                        if "groundedContent" in rep:
-                            if "content" in rep["groundedContent"]:
-                                if "thought" not in rep['groundedContent']['content']:
-                                    agentspace_answer = f"{agentspace_answer} {r['answer']['replies'][0]['groundedContent']['content']['text']}"
+async def _warm_up_connection():
+    # Any response keeps the TLS connection in the shared client's pool for the first real call
+    response = await get_async_client().get(f"{discovery_engine_endpoint(LOCATION, DISCOVERY_ENGINE_API_ENDPOINT)}/", timeout=10)
+    await response.aread()
 
-        logger.info(f'"Answer": {agentspace_answer}, "url":{url}')
-                                    
-        return agentspace_answer
 
+async def _warm_up_probe(query):
+    # Sent the way ragAgent sends it, so the stream handling is warm too; the answer is not cached
+    extractor = StreamAssistExtractor()
+    access_token = SERVICE_ACCOUNT_TOKENS.get_token()
+    async for _ in AsyncDatastoreService(access_token)._stream_streamAssist(PROJECT_ID, LOCATION, query, extractor, access_token, None, None):
+        pass
 
 
-def search_tasks(query: str, tool_context: ToolContext):
+def warm_up(force: bool = False) -> dict:
+    """
+    Pays the first-query costs before the replica serves: credential discovery and token
+    refresh, then DNS and TLS to the Discovery Engine host through the shared httpx client on
+    `http_loop()`, the path ragAgent queries through. With AGENT_WARMUP_PROBE set, that query
+    is also streamed once (as the service account). See datastore_service.run_warm_up.
+    """
+    steps = [
+        ("token", SERVICE_ACCOUNT_TOKENS.get_token),
+        ("connection", lambda: _on_http_loop(_warm_up_connection(), timeout=30)),
+    ]
+    if AGENT_WARMUP_PROBE:
+        steps.append(("probe", lambda: _on_http_loop(_warm_up_probe(AGENT_WARMUP_PROBE), timeout=120)))
+    return run_warm_up(steps, force)
+
+
+def search_tasks(query: str, tool_context: "ToolContext"):
         """
         Searches the task registry using the DatastoreService.
         
@@ -140,90 +377,144 @@ def search_tasks(query: str, tool_context: ToolContext):
         Returns:
             dict: The search results from the DatastoreService in JSON format.
         """
-        datastore_service = None
+        datastore_service = get_datastore_service()
         auth_name= f"temp:{AUTH_NAME}"
-        access_token = tool_context.state.get(auth_name)
-        if access_token: 
-            datastore_service = DatastoreService(access_token)
-        else:
-           access_token = ""
-           datastore_service = DatastoreService(access_token)
+        access_token = datastore_service.resolve_access_token(tool_context.state.get(auth_name), tool_context.user_id)
         # Call the search method of the DatastoreService with the project ID, App Engine ID, and query
-        results = datastore_service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, query) 
+        results = datastore_service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, query, access_token)
         # Return the search results
-        return results
+        return results.text
 
 
-# --- Custom Orchestrator Agent ---
-class ragAgent(BaseAgent):
-    """
-    Custom agent for a story generation and refinement workflow.
+def _build_root_agent():
+    from typing import Any, AsyncGenerator
+    from typing_extensions import override
 
-    This agent orchestrates a sequence of LLM agents to generate a story,
-    critique it, revise it, check grammar and tone, and potentially
-    regenerate the story if the tone is negative.
-    """
+    from google.adk.agents import BaseAgent
+    from google.adk.agents.invocation_context import InvocationContext
+    from google.adk.events import Event, EventActions
+    from google.genai import types
 
-
-    def __init__(
-        self,
-        name: str,
-    ):
+    # --- Custom Orchestrator Agent ---
+    class ragAgent(BaseAgent):
         """
-        Initializes the StoryFlowAgent.
+        Custom agent for a story generation and refinement workflow.
 
-        Args:
-            name: The name of the agent.
+        This agent orchestrates a sequence of LLM agents to generate a story,
+        critique it, revise it, check grammar and tone, and potentially
+        regenerate the story if the tone is negative.
         """
 
-        # Pydantic will validate and assign them based on the class annotations.
-        super().__init__(
-            name=name,
-        )
-
-    @override
-    async def _run_async_impl(
-        self, ctx: InvocationContext, user_input: Any = None
-    ) -> AsyncGenerator[Event, None]:
-        """
-        Implements the custom orchestration logic for the story workflow.
-        Uses the instance attributes assigned by Pydantic (e.g., self.story_generator).
-        """
 
-        query = ctx.user_content.parts[0].text
-        logger.info(f'"Query": {query}')
-        
-        datastore_service = None
-        auth_name= f"temp:{AUTH_NAME}"
-        access_token = ctx.session.state.get(auth_name)
-        if access_token: 
-            datastore_service = DatastoreService(access_token)
-        else:
-           access_token = ""
-           datastore_service = DatastoreService(access_token)
-        # Call the search method of the DatastoreService with the project ID, App Engine ID, and query
-        result = datastore_service.search_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, query)
+        def __init__(
+            self,
+            name: str,
+        ):
+            """
+            Initializes the StoryFlowAgent.
+
+            Args:
+                name: The name of the agent.
+            """
+
+            # Pydantic will validate and assign them based on the class annotations.
+            super().__init__(
+                name=name,
+            )
+
+        @override
+        async def _run_async_impl(
+            self, ctx: InvocationContext, user_input: Any = None
+        ) -> AsyncGenerator[Event, None]:
+            """
+            Implements the custom orchestration logic for the story workflow.
+            Uses the instance attributes assigned by Pydantic (e.g., self.story_generator).
+            """
+
+            query = ctx.user_content.parts[0].text
         
-        event_with_state_change = Event(
-            author=self.name,
-            content=types.Content(parts=[types.Part(text=result)]),
-            partial = False,
-            turn_complete=True
-        )
-
-        # 2. Yield the event to the Runner for processing & commit
-        yield event_with_state_change
-
-logger.info(f"MODEL: `{MODEL}`")
-logger.info(f"AGENT_APP_NAME: `{AGENT_APP_NAME}`")
-logger.info(f"PROJECT_ID: `{PROJECT_ID}`")
-logger.info(f"LOCATION: `{LOCATION}`")
-logger.info(f"DATA_STORE_ID: `{DATA_STORE_ID}`")
-logger.info(f"AUTH_NAME: `{AUTH_NAME}`")
-logger.info(f"AGENTSPACE_APP_ID: `{AGENTSPACE_APP_ID}`")
-
-
-# --- Create the custom agent instance ---
-root_agent = ragAgent(
-    name="root"
-)
\ No newline at end of file
+            # Not made current: this generator is resumed in the Runner's context after each yield
+            with TELEMETRY.span("ragAgent.run", current=False) as span:
+                emit_time = 0.0
+                datastore_service = get_async_datastore_service()
+                auth_name= f"temp:{AUTH_NAME}"
+                access_token = await datastore_service.resolve_access_token(ctx.session.state.get(auth_name), ctx.session.user_id)
+                cache_key = ANSWER_CACHE.key("streamAssist", query, AGENTSPACE_APP_ID, access_token)
+                session = None
+                if DISCOVERY_SESSION_AFFINITY:
+                    session = DISCOVERY_SESSIONS.get(ctx.session.id, ctx.session.state.get(DISCOVERY_SESSION_STATE_KEY))
+                result = None
+                source = "session"
+                # A follow-up answer depends on its conversation, so it is neither cached nor shared
+                if not session:
+                    result = ANSWER_CACHE.get(cache_key)
+                    source = "cached"
+                    if result is None:
+                        # Identical queries in flight in other sessions share this session's upstream call
+                        _, result = await ASYNC_SEARCH_FLIGHTS.follow(cache_key)
+                        source = "shared"
+                if result is None:
+                    source = "session" if session else "upstream"
+                    with contextlib.nullcontext() if session else ASYNC_SEARCH_FLIGHTS.lead(cache_key) as flight:
+                        # Forward each answer chunk as a partial event as soon as the assistant streams it
+                        extractor = StreamAssistExtractor()
+                        async for chunk in datastore_service.stream_streamAssist(PROJECT_ID, LOCATION, DATA_STORE_ID, query, extractor, access_token, span, session):
+                            emit_started = time.perf_counter()
+                            yield Event(
+                                author=self.name,
+                                content=types.Content(parts=[types.Part(text=chunk)]),
+                                partial=True,
+                            )
+                            emit_time += time.perf_counter() - emit_started
+                        result = extractor.result()
+                        if flight is not None:
+                            flight.set_result(result.without_session())
+                    if result.text and not session:
+                        ANSWER_CACHE.put(cache_key, result.without_session())
+                LOG("ragAgent.answer", query=query, answer=result.text, source=source, references=len(result.references),
+                    total_time=result.total_time if source in ("upstream", "session") else None)
+
+                # The Discovery Engine session is committed to the ADK session state with the final event
+                state_delta = {}
+                if result.session:
+                    state_delta[DISCOVERY_SESSION_STATE_KEY] = DISCOVERY_SESSIONS.put(ctx.session.id, result.session)
+
+                event_with_state_change = Event(
+                    author=self.name,
+                    content=types.Content(parts=[types.Part(text=result.text)]),
+                    partial = False,
+                    turn_complete=True,
+                    actions=EventActions(state_delta=state_delta),
+                )
+
+                if span is not None:
+                    span.set_attribute("source", source)
+
+                # 2. Yield the event to the Runner for processing & commit
+                emit_started = time.perf_counter()
+                yield event_with_state_change
+                # Time the Runner spent handling our events before asking for the next one
+                TELEMETRY.record("emit", emit_time + time.perf_counter() - emit_started, span)
+
+    logger.debug(
+        f"MODEL: `{MODEL}`, AGENT_APP_NAME: `{AGENT_APP_NAME}`, PROJECT_ID: `{PROJECT_ID}`, LOCATION: `{LOCATION}`, "
+        f"DATA_STORE_ID: `{DATA_STORE_ID}`, AUTH_NAME: `{AUTH_NAME}`, AGENTSPACE_APP_ID: `{AGENTSPACE_APP_ID}`"
+    )
+
+    # --- Create the custom agent instance ---
+    return ragAgent(
+        name="root"
+    )
+
+
+_root_agent_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # root_agent is built on first access (PEP 562), which is what pulls in google.adk and google.genai
+    if name == "root_agent":
+        with _root_agent_lock:
+            if "root_agent" not in globals():
+                globals()["root_agent"] = _build_root_agent()
+        return globals()["root_agent"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
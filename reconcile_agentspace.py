@@ -0,0 +1,206 @@
+import asyncio
+import os
+import re
+import sys
+import yaml
+from dotenv import load_dotenv
+from agentspace_manager import AsyncAgentspaceManager
+
+load_dotenv()
+
+# Declarative spec of the authorizations and agents, see agentspace_spec_sample.yaml
+AGENTSPACE_SPEC = os.getenv('AGENTSPACE_SPEC', 'agentspace.yaml')
+# Print the plan without calling the API
+DRY_RUN = os.getenv('RECONCILE_DRY_RUN', '').lower() in ('1', 'true', 'yes')
+
+DEFAULT_AUTH_URI = "https://accounts.google.com/o/oauth2/v2/auth"
+DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+_UNRESOLVED_VAR = re.compile(r"\$\{([^}]*)\}")
+
+
+def _expand_vars(value, missing):
+    if isinstance(value, dict):
+        return {key: _expand_vars(item, missing) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand_vars(item, missing) for item in value]
+    if isinstance(value, str):
+        value = os.path.expandvars(value)
+        missing.update(_UNRESOLVED_VAR.findall(value))
+    return value
+
+
+def load_spec(path):
+    """
+    Reads the YAML spec, then expands ${VAR} references from the environment (and .env) in
+    its string values, so a value containing YAML syntax cannot change the spec's structure.
+
+    Raises:
+        ValueError: If a ${VAR} reference is not set.
+    """
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    missing = set()
+    spec = _expand_vars(spec, missing)
+    if missing:
+        raise ValueError(f"{path} references unset variables: {', '.join(sorted(missing))}")
+    return spec
+
+
+def _tail(resource_name, segments=1):
+    return "/".join(resource_name.split("/")[-segments:]) if resource_name else None
+
+
+def desired_authorization(client, auth):
+    return {
+        "auth_id": auth["id"],
+        "client_id": auth["client_id"],
+        "client_secret": auth["client_secret"],
+        "auth_uri": client.generate_auth_uri(
+            base_auth_uri=auth.get("base_auth_uri", DEFAULT_AUTH_URI),
+            client_id=auth["client_id"],
+            scopes=auth["scopes"],
+        ),
+        "token_uri": auth.get("token_uri", DEFAULT_TOKEN_URI),
+    }
+
+
+def authorization_changes(existing, desired):
+    # The API never returns the client secret, so a secret-only change cannot be detected.
+    oauth = existing.get("serverSideOauth2", {})
+    fields = (("clientId", "client_id"), ("authorizationUri", "auth_uri"), ("tokenUri", "token_uri"))
+    return [field for field, key in fields if oauth.get(field) != desired[key]]
+
+
+def desired_agent(agent):
+    return {
+        "display_name": agent["display_name"],
+        "description": agent.get("description", ""),
+        "tool_description": agent.get("tool_description", agent.get("description", "")),
+        "adk_deployment_id": str(agent["reasoning_engine_id"]),
+        "adk_deployment_location": agent["reasoning_engine_location"],
+        "icon_uri": agent.get("icon_uri"),
+        "auth_ids": agent.get("auth_ids") or [],
+    }
+
+
+def agent_changes(existing, desired):
+    definition = existing.get("adkAgentDefinition", {})
+    current = {
+        "description": existing.get("description", ""),
+        "tool_description": definition.get("toolSettings", {}).get("toolDescription", ""),
+        "reasoning_engine": _tail(definition.get("provisionedReasoningEngine", {}).get("reasoningEngine"), 4),
+        "icon_uri": existing.get("icon", {}).get("uri"),
+        "auth_ids": sorted(_tail(name) for name in existing.get("authorizationConfig", {}).get("toolAuthorizations", [])),
+    }
+    wanted = {
+        "description": desired["description"],
+        "tool_description": desired["tool_description"],
+        "reasoning_engine": f"locations/{desired['adk_deployment_location']}/reasoningEngines/{desired['adk_deployment_id']}",
+        "icon_uri": desired["icon_uri"] or current["icon_uri"],
+        "auth_ids": sorted(desired["auth_ids"]) or current["auth_ids"],
+    }
+    return [field for field in wanted if current[field] != wanted[field]]
+
+
+async def plan(client, spec):
+    """
+    Diffs the spec against the live authorizations and agents.
+
+    Returns:
+        Three lists of (description, awaitable factory) actions, to run in order:
+        authorization creates/updates, agent creates/updates/deletes, authorization deletes.
+    """
+    apps = [(app, client.for_app(app["app_id"])) for app in spec.get("apps", [])]
+
+    async def list_authorizations():
+        return {_tail(auth["name"]): auth async for auth in client.aiter_authorizations()}
+
+    # Every listing is independent, fetch them all at once
+    existing_auths, *existing_agents = await asyncio.gather(
+        list_authorizations(), *(app_client.find_agents() for _, app_client in apps)
+    )
+
+    auth_actions, agent_actions, auth_deletes = [], [], []
+
+    wanted_auths = {auth["id"]: desired_authorization(client, auth) for auth in spec.get("authorizations", [])}
+    for auth_id, desired in wanted_auths.items():
+        if auth_id not in existing_auths:
+            auth_actions.append((f"create authorization {auth_id}", lambda d=desired: client.create_authorization(**d)))
+            continue
+        changes = authorization_changes(existing_auths[auth_id], desired)
+        if changes:
+            auth_actions.append((f"update authorization {auth_id} ({', '.join(changes)})",
+                                 lambda d=desired: client.update_authorization(**d)))
+    if spec.get("prune_authorizations"):
+        for auth_id in existing_auths.keys() - wanted_auths.keys():
+            auth_deletes.append((f"delete authorization {auth_id}", lambda a=auth_id: client.delete_authorization(a)))
+
+    for (app, app_client), agents in zip(apps, existing_agents):
+        by_name = {}
+        for agent in agents:
+            by_name.setdefault(agent.get("displayName"), []).append(agent)
+        app_id = app["app_id"]
+        unwanted = []
+        for desired in (desired_agent(agent) for agent in app.get("agents", [])):
+            matches = by_name.pop(desired["display_name"], [])
+            if not matches:
+                agent_actions.append((f"[{app_id}] register agent {desired['display_name']}",
+                                      lambda c=app_client, d=desired: c.register_agent(**d)))
+                continue
+            existing = matches[0]
+            unwanted.extend(matches[1:])
+            changes = agent_changes(existing, desired)
+            if changes:
+                agent_actions.append((f"[{app_id}] update agent {desired['display_name']} ({', '.join(changes)})",
+                                      lambda c=app_client, n=existing["name"], d=desired: c.update_agent(n, **d)))
+        # Only a pruned app loses the agents (and same-name duplicates) the spec does not list
+        if app.get("prune"):
+            unwanted.extend(agent for agents in by_name.values() for agent in agents)
+            for agent in unwanted:
+                agent_actions.append((f"[{app_id}] delete agent {agent.get('displayName')} ({agent['name']})",
+                                      lambda c=app_client, n=agent["name"]: c.delete_agent(n)))
+
+    return auth_actions, agent_actions, auth_deletes
+
+
+async def reconcile(spec_path=AGENTSPACE_SPEC, dry_run=DRY_RUN):
+    """
+    Brings Agentspace in line with the spec using the minimal set of calls. Calls within a
+    phase are independent and run concurrently; authorizations are created before the agents
+    that reference them and deleted after the agents that used them.
+
+    Returns:
+        The descriptions of the actions taken (or planned, on a dry run).
+    """
+    spec = load_spec(spec_path)
+    client = AsyncAgentspaceManager(
+        project_id=str(spec["project_number"]), app_id=None, location=spec.get("location", "global")
+    )
+    async with client:
+        phases = await plan(client, spec)
+        actions = [description for phase in phases for description, _ in phase]
+        if not actions:
+            print("Agentspace matches the spec, nothing to do")
+            return actions
+        for description in actions:
+            print(description)
+        if dry_run:
+            return actions
+
+        failed = False
+        for phase in phases:
+            results = await client.gather((call() for _, call in phase), return_exceptions=True)
+            for (description, _), result in zip(phase, results):
+                if isinstance(result, Exception):
+                    failed = True
+                    print(f"FAILED {description}: {result}")
+            # Later phases depend on this one, e.g. agents on their authorizations
+            if failed:
+                raise SystemExit(1)
+        print(client.stats.summary())
+    return actions
+
+
+if __name__ == "__main__":
+    asyncio.run(reconcile(sys.argv[1] if len(sys.argv) > 1 else AGENTSPACE_SPEC))